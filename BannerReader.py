@@ -0,0 +1,145 @@
+""" Read banners from a banners file one at a time """
+
+import json
+import re
+
+# characters that may continue a JSON number
+NUMBER_TAIL_REGEX = re.compile(r"[0-9.eE+-]*")
+
+
+class BannerReader():
+    def __init__(self, fileName, limit=None, offset=0, shard=0, numShards=1, chunkSize=1 << 20):
+        '''
+        This function prepares reading a banners file without loading it into memory.
+        The file is either a JSON object mapping banner IDs to banners (see README), or, if its name
+        ends with ".jsonl", JSON Lines with one banner per line (its "id" field, or else its line
+        number, is the banner ID).
+        :param fileName: A string containing the path of the banners file
+        :param limit: Maximum number of banners to read (None reads all)
+        :param offset: Number of banners to skip at the start of the file
+        :param shard: Only banners whose position after the offset modulo numShards equals shard are read
+        :param numShards: Number of shards the banners are split into
+        :param chunkSize: Number of characters read from the file at a time
+        '''
+        self.fileName = fileName
+        self.limit = limit
+        self.offset = offset
+        self.shard = shard
+        self.numShards = numShards
+        self.chunkSize = chunkSize
+        self.decoder = json.JSONDecoder()
+
+    def __iter__(self):
+        '''
+        This function reads the selected banners lazily.
+        :return: A generator of (banner ID, banner) tuples
+        '''
+        if self.limit is not None and self.limit <= 0:
+            return
+
+        done = 0
+        with open(self.fileName, encoding="utf-8") as bannersFile:
+            if self.fileName.endswith(".jsonl"):
+                records = self.readJsonLines(bannersFile)
+            else:
+                records = self.readJsonObject(bannersFile)
+
+            for position, record in enumerate(records):
+                if position < self.offset or (
+                        position - self.offset) % self.numShards != self.shard:
+                    continue
+                yield record
+                done += 1
+                if done == self.limit:
+                    return
+
+    def readJsonLines(self, bannersFile):
+        '''
+        This function reads banners from a JSON Lines file.
+        :param bannersFile: A file object of the banners file
+        :return: A generator of (banner ID, banner) tuples
+        '''
+        for lineNum, line in enumerate(bannersFile, 1):
+            if line.strip():
+                banner = json.loads(line)
+                yield str(banner.get("id", lineNum)), banner
+
+    def readJsonObject(self, bannersFile):
+        '''
+        This function reads the items of a top-level JSON object incrementally.
+        :param bannersFile: A file object of the banners file
+        :return: A generator of (banner ID, banner) tuples
+        '''
+        self.file = bannersFile
+        self.buffer = ""
+        self.pos = 0
+
+        self.expect("{")
+        if self.peek() == "}":
+            return
+        while True:
+            bannerID = self.decodeValue()
+            self.expect(":")
+            banner = self.decodeValue()
+            yield bannerID, banner
+            if self.expect(",}") == "}":
+                return
+
+    def fill(self):
+        '''
+        This function appends the next chunk of the file to the buffer, dropping consumed text.
+        :return: False at the end of the file or else True
+        '''
+        chunk = self.file.read(self.chunkSize)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        '''
+        This function skips whitespace and returns the next character without consuming it.
+        :return: A single character string, or None at the end of the file
+        '''
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return None
+
+    def expect(self, chars):
+        '''
+        This function consumes the next character, which must be one of the given characters.
+        :param chars: A string containing the allowed characters
+        :return: The consumed character
+        '''
+        char = self.peek()
+        if char is None or char not in chars:
+            raise ValueError("Expected one of '" + chars + "' in " + self.fileName +
+                             " but found " + repr(char))
+        self.pos += 1
+        return char
+
+    def decodeValue(self):
+        '''
+        This function decodes the next JSON value, reading more of the file until it is complete.
+        :return: The decoded value
+        '''
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # a number may continue in the next chunk: the decoder stops at the end of the buffer,
+            # or before it if the chunk ends inside the number (e.g. after "1." or "1.5e")
+            if type(value) in (int, float) and NUMBER_TAIL_REGEX.fullmatch(
+                    self.buffer, end) and self.fill():
+                continue
+            self.pos = end
+            return value
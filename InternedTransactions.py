@@ -0,0 +1,66 @@
+""" Store transactions as arrays of integer item ids instead of lists of item strings """
+
+from array import array
+import numpy as np
+
+# number of transactions converted to lists at a time while iterating
+ITERATION_CHUNK_SIZE = 1 << 16
+
+
+class InternedTransactions():
+    def __init__(self, transactions):
+        '''
+        This function interns the items of transactions: every distinct item (banner, device type,
+        vendor or product) is stored once and transactions hold integer ids. Ids are numbered in
+        sorted item order, so they sort as their items do.
+        :param transactions: An iterable of lists of items
+        '''
+        # provisional ids in order of first appearance
+        itemIds = {}
+        ids = array('l')
+        offsets = array('l', [0])
+        for transaction in transactions:
+            ids.extend([itemIds.setdefault(item, len(itemIds))
+                        for item in transaction])
+            offsets.append(len(ids))
+        items = list(itemIds)
+
+        order = sorted(range(len(items)), key=items.__getitem__)
+        sortedIds = np.empty(len(items), dtype=np.int64)
+        sortedIds[order] = np.arange(len(items), dtype=np.int64)
+
+        # maps item ids back to items
+        self.items = [items[itemId] for itemId in order]
+        self.ids = sortedIds[np.array(ids, dtype=np.int64)]
+        self.offsets = np.array(offsets, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        '''
+        This function iterates over the transactions.
+        :return: A generator of lists of item ids
+        '''
+        for first in range(0, len(self), ITERATION_CHUNK_SIZE):
+            last = min(first + ITERATION_CHUNK_SIZE, len(self))
+            offsets = self.offsets[first:last + 1].tolist()
+            ids = self.ids[offsets[0]:offsets[-1]].tolist()
+            for start, end in zip(offsets, offsets[1:]):
+                yield ids[start - offsets[0]:end - offsets[0]]
+
+    def getFirstItemIds(self):
+        '''
+        This function finds the ids of the first items (banners) of all transactions.
+        :return: A set of item ids
+        '''
+        starts = self.offsets[:-1][self.offsets[:-1] < self.offsets[1:]]
+        return set(self.ids[starts].tolist())
+
+    def decode(self, itemIds):
+        '''
+        This function maps item ids back to items.
+        :param itemIds: An iterable of item ids
+        :return: A list of items
+        '''
+        return [self.items[itemId] for itemId in itemIds]
@@ -0,0 +1,176 @@
+""" Find word-bounded occurrences of many items in a webpage text in a single pass """
+
+import re
+
+# characters that make an item behave differently as a regex than as a literal
+REGEX_METACHARACTERS = set(".^$*+?{}[]\\|()")
+
+
+def isWordChar(char):
+    '''
+    This function checks if a character is a regex word character.
+    :param char: A single character string
+    :return: True if the character matches \\w or else False
+    '''
+    return char.isalnum() or char == "_"
+
+
+class ItemMatcher():
+    def __init__(self, *itemLists):
+        '''
+        This function builds an Aho-Corasick automaton over all items of the given lists.
+        Items containing regex metacharacters are matched as regexes (as NameFinder.findItemsInText
+        does) but only when their literal text is found by the automaton.
+        :param itemLists: Lists of strings containing items (e.g. device types, vendor names)
+        '''
+        self.itemLists = itemLists
+        self.patterns = []
+        self.patternIds = {}
+        self.regexes = []
+        # maps each pattern to the (list #, item #) slots it occupies
+        self.slots = []
+
+        for listNum, items in enumerate(itemLists):
+            for itemNum, item in enumerate(items):
+                if item not in self.patternIds:
+                    self.patternIds[item] = len(self.patterns)
+                    self.patterns.append(item)
+                    if REGEX_METACHARACTERS.intersection(item):
+                        self.regexes.append(re.compile("\\b" + item + "\\b"))
+                    else:
+                        self.regexes.append(None)
+                    self.slots.append([])
+                self.slots[self.patternIds[item]].append((listNum, itemNum))
+
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self.buildTrie()
+        self.buildFailureLinks()
+
+    def buildTrie(self):
+        '''
+        This function inserts all patterns into the automaton trie.
+        :return: None
+        '''
+        for patternId, pattern in enumerate(self.patterns):
+            if pattern == "":
+                continue
+            state = 0
+            for char in pattern:
+                nextState = self.goto[state].get(char)
+                if nextState is None:
+                    nextState = len(self.goto)
+                    self.goto[state][char] = nextState
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = nextState
+            self.output[state].append(patternId)
+
+    def buildFailureLinks(self):
+        '''
+        This function computes failure links breadth-first and merges the outputs of suffix states.
+        :return: None
+        '''
+        queue = list(self.goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, nextState in self.goto[state].items():
+                queue.append(nextState)
+                failState = self.fail[state]
+                while failState and char not in self.goto[failState]:
+                    failState = self.fail[failState]
+                fallback = self.goto[failState].get(char, 0)
+                self.fail[nextState] = fallback if fallback != nextState else 0
+                self.output[nextState] = self.output[nextState] + \
+                    self.output[self.fail[nextState]]
+
+    def scan(self, text):
+        '''
+        This function runs the automaton over a text once.
+        :param text: A string containing webpage text
+        :return: A dictionary that maps pattern ids to the start offsets of all their (possibly overlapping) occurrences
+        '''
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        patterns = self.patterns
+        hits = {}
+        state = 0
+
+        for idx, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for patternId in output[state]:
+                start = idx + 1 - len(patterns[patternId])
+                if patternId in hits:
+                    hits[patternId].append(start)
+                else:
+                    hits[patternId] = [start]
+
+        return hits
+
+    def isBoundary(self, text, idx):
+        '''
+        This function checks if there is a regex word boundary (\\b) at an offset of a text.
+        :param text: A string containing webpage text
+        :param idx: An int offset into the text
+        :return: True if there is a word boundary at the offset or else False
+        '''
+        before = idx > 0 and isWordChar(text[idx - 1])
+        after = idx < len(text) and isWordChar(text[idx])
+        return before != after
+
+    def boundedStarts(self, text, pattern, starts):
+        '''
+        This function keeps the occurrences that re.finditer("\\b" + pattern + "\\b") would report.
+        :param text: A string containing webpage text
+        :param pattern: A string containing the matched item
+        :param starts: A sorted list of start offsets of the item in the text
+        :return: A list of start offsets of non-overlapping, word-bounded occurrences
+        '''
+        found = []
+        lastEnd = 0
+        for start in starts:
+            end = start + len(pattern)
+            if start < lastEnd:
+                continue
+            if self.isBoundary(text, start) and self.isBoundary(text, end):
+                found.append(start)
+                lastEnd = end
+        return found
+
+    def findAll(self, text):
+        '''
+        This function finds the items of every list in a text.
+        :param text: A string containing webpage text
+        :return: A list (one entry per item list) of lists of (item, start offset) tuples,
+                 ordered like NameFinder.findItemsInText orders them
+        '''
+        hits = self.scan(text)
+        foundPerSlot = []
+
+        for patternId, starts in hits.items():
+            pattern = self.patterns[patternId]
+            itemRegex = self.regexes[patternId]
+            if itemRegex is not None:
+                found = [(pattern, m.start(0))
+                         for m in itemRegex.finditer(text)]
+            else:
+                found = [(pattern, start)
+                         for start in self.boundedStarts(text, pattern, starts)]
+            if not found:
+                continue
+            for slot in self.slots[patternId]:
+                foundPerSlot.append((slot, found))
+
+        foundPerSlot.sort(key=lambda x: x[0])
+        foundPerList = [[] for _ in self.itemLists]
+        for (listNum, _), found in foundPerSlot:
+            foundPerList[listNum].extend(found)
+
+        return foundPerList
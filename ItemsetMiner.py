@@ -0,0 +1,135 @@
+""" Mine frequent itemsets and association rules from transactions with integer item ids """
+
+from collections import namedtuple
+from itertools import combinations
+import numpy as np
+
+# records with the fields of apyori's records, so that they can be used in their place
+RelationRecord = namedtuple(
+    'RelationRecord', ('items', 'support', 'ordered_statistics'))
+OrderedStatistic = namedtuple(
+    'OrderedStatistic', ('items_base', 'items_add', 'confidence', 'lift'))
+
+
+class ItemsetMiner():
+    def __init__(self, transactions):
+        '''
+        This function encodes transactions vertically: every distinct item gets an integer id
+        (in sorted item order) and a sorted array of the ids of the transactions containing it.
+        :param transactions: A list of lists of items
+        '''
+        itemTids = {}
+        numTransactions = 0
+        for tid, transaction in enumerate(transactions):
+            for item in transaction:
+                tids = itemTids.get(item)
+                if tids is None:
+                    itemTids[item] = [tid]
+                elif tids[-1] != tid:
+                    tids.append(tid)
+            numTransactions += 1
+
+        self.numTransactions = numTransactions
+        self.items = sorted(itemTids)
+        self.tidLists = [np.array(itemTids[item], dtype=np.int64)
+                         for item in self.items]
+        # scratch array marking the transactions of an itemset during intersections
+        self.marks = np.zeros(numTransactions, dtype=bool)
+
+    def intersect(self, tids, otherTids):
+        '''
+        This function intersects two sorted arrays of transaction ids in linear time.
+        :param tids: A sorted numpy array of transaction ids
+        :param otherTids: A sorted numpy array of transaction ids
+        :return: A sorted numpy array of the transaction ids in both arrays
+        '''
+        self.marks[tids] = True
+        common = otherTids[self.marks[otherTids]]
+        self.marks[tids] = False
+        return common
+
+    def nextCandidates(self, frequentItemsets):
+        '''
+        This function joins frequent itemsets of one length into candidates one item longer.
+        :param frequentItemsets: A dictionary that maps sorted tuples of item ids to their transaction ids
+        :return: A generator of (candidate, first joined itemset, second joined itemset) tuples,
+                 with candidates in lexicographic order and all their subsets frequent
+        '''
+        itemsets = sorted(frequentItemsets)
+        start = 0
+        while start < len(itemsets):
+            prefix = itemsets[start][:-1]
+            end = start
+            while end < len(itemsets) and itemsets[end][:-1] == prefix:
+                end += 1
+
+            for i in range(start, end):
+                for j in range(i + 1, end):
+                    candidate = itemsets[i] + itemsets[j][-1:]
+                    # the subsets dropping one of the last two items are the joined itemsets
+                    if all(candidate[:k] + candidate[k + 1:] in frequentItemsets
+                           for k in range(len(candidate) - 2)):
+                        yield candidate, itemsets[i], itemsets[j]
+            start = end
+
+    def getOrderedStatistics(self, itemset, support, supports, minConfidence):
+        '''
+        This function computes the rules of a frequent itemset, from every subset of it to the rest.
+        :param itemset: A sorted tuple of item ids
+        :param support: A float containing the support of the itemset
+        :param supports: A dictionary that maps frequent itemsets to their supports
+        :param minConfidence: A float containing the minimum confidence of a rule
+        :return: A list of OrderedStatistic tuples of the rules with enough confidence
+        '''
+        orderedStatistics = []
+        for baseLength in range(len(itemset)):
+            for base in combinations(itemset, baseLength):
+                add = tuple(itemId for itemId in itemset if itemId not in base)
+                confidence = support / (supports[base] if base else 1.0)
+                if confidence < minConfidence:
+                    continue
+                lift = confidence / supports[add]
+                orderedStatistics.append(OrderedStatistic(
+                    frozenset(self.items[itemId] for itemId in base),
+                    frozenset(self.items[itemId] for itemId in add),
+                    confidence,
+                    lift))
+        return orderedStatistics
+
+    def mine(self, minSupport, minConfidence=0.0):
+        '''
+        This function finds the frequent itemsets with at least one rule of enough confidence,
+        producing the records apyori.apriori produces, in the same order.
+        :param minSupport: A float containing the minimum support of an itemset
+        :param minConfidence: A float containing the minimum confidence of a rule
+        :return: A generator of RelationRecord tuples
+        '''
+        if minSupport <= 0:
+            raise ValueError('minimum support must be > 0')
+
+        supports = {}
+        frequentItemsets = {}
+        candidates = (((itemId,), tids)
+                      for itemId, tids in enumerate(self.tidLists))
+        while True:
+            for itemset, tids in candidates:
+                support = float(len(tids)) / self.numTransactions
+                if support < minSupport:
+                    continue
+                supports[itemset] = support
+                frequentItemsets[itemset] = tids
+
+                orderedStatistics = self.getOrderedStatistics(
+                    itemset, support, supports, minConfidence)
+                if orderedStatistics:
+                    yield RelationRecord(
+                        frozenset(self.items[itemId] for itemId in itemset),
+                        support,
+                        orderedStatistics)
+
+            if not frequentItemsets:
+                return
+            previousItemsets = frequentItemsets
+            frequentItemsets = {}
+            candidates = ((candidate, self.intersect(previousItemsets[first], previousItemsets[second]))
+                          for candidate, first, second in self.nextCandidates(previousItemsets))
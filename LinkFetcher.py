@@ -1,22 +1,138 @@
 import config
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document, DISCOVERY_URI
+import concurrent.futures
+import httplib2
 import logging
+import threading
+import time
+
+
+class TokenBucket():
+    def __init__(self, rate, capacity):
+        '''
+        This function creates a token bucket rate limiter.
+        :param rate: A float containing the number of tokens added per second
+        :param capacity: An int containing the maximum number of tokens (burst size)
+        '''
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        '''
+        This function blocks until a token is available and consumes it.
+        :return: None
+        '''
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
 
 
 class LinkFetcher():
+    # the discovery document is fetched once per process and shared by all clients
+    discoveryDocument = None
+    discoveryLock = threading.Lock()
+
+    def __init__(self):
+        # httplib2 connections are not thread-safe, so every thread keeps its own
+        # keep-alive client per key
+        self.local = threading.local()
+
+    def getDiscoveryDocument(self):
+        '''
+        This function returns the (cached) discovery document of the custom search API.
+        :return: A string containing the discovery document
+        '''
+        with LinkFetcher.discoveryLock:
+            if LinkFetcher.discoveryDocument is None:
+                url = config.SEARCH_API_DISCOVERY_URL or DISCOVERY_URI
+                url = url.format(api="customsearch", apiVersion="v1")
+                response, content = httplib2.Http().request(url)
+                if response.status >= 400:
+                    raise Exception(
+                        "Could not fetch discovery document from " + url +
+                        ", status: " + str(response.status))
+                LinkFetcher.discoveryDocument = content
+        return LinkFetcher.discoveryDocument
 
-    def getUrlsGoogle(self, query, key, **kwargs):
+    def getService(self, key):
+        '''
+        This function returns the calling thread's search service client for a key.
+        :param key: A string containing Google search API key
+        :return: A googleapiclient Resource for the custom search API
+        '''
+        services = getattr(self.local, "services", None)
+        if services is None:
+            services = self.local.services = {}
+        if key not in services:
+            services[key] = build_from_document(
+                self.getDiscoveryDocument(),
+                developerKey=key,
+                http=httplib2.Http())
+        return services[key]
+
+    def getUrlsGoogle(self, query, key, limiter=None, retries=0, **kwargs):
         '''
         This function obtains Google search result URLs against a query.
         :param query: A string containing query keywords
         :param key: A string containing Google search API key
+        :param limiter: An optional TokenBucket to acquire from before every request
+        :param retries: An int containing the number of retries (with exponential backoff) on errors
         :return: A list of strings containing URLs
         '''
+        for attempt in range(retries + 1):
+            if limiter is not None:
+                limiter.acquire()
+            try:
+                service = self.getService(key)
+                results = service.cse().list(q=query, cx=config.CSE_ID).execute()
+                return results
+            except Exception as e:
+                logging.exception(
+                    "Error in fetching links from Google search: " + str(e))
+                if attempt < retries:
+                    time.sleep(config.SEARCH_API_BACKOFF * 2 ** attempt)
+        return {}
+
+    def getUrlsGoogleBatch(self, queries, key, limiter=None, retries=0, numThreads=1):
+        '''
+        This function obtains Google search results for many queries using one key.
+        The requests are started right away, before the returned generator is consumed; closing
+        the generator cancels the requests not yet sent.
+        :param queries: A list of strings containing query keywords
+        :param key: A string containing Google search API key
+        :param limiter: An optional TokenBucket to acquire from before every request
+        :param retries: An int containing the number of retries (with exponential backoff) on errors
+        :param numThreads: An int containing the number of concurrent requests
+        :return: A generator of (query, results) tuples in the order of queries
+        '''
+        executor = concurrent.futures.ThreadPoolExecutor(numThreads)
+        searches = [(query, executor.submit(self.getUrlsGoogle, query, key, limiter, retries))
+                    for query in queries]
+        # pending searches still run; the threads exit once they are done
+        executor.shutdown(wait=False)
+        return self.collectSearches(searches)
+
+    def collectSearches(self, searches):
+        '''
+        This function waits for the results of started searches in order. Closing the generator
+        early cancels the searches that have not started, so that no more requests are sent.
+        :param searches: A list of (query, future) tuples
+        :return: A generator of (query, results) tuples in the order of searches
+        '''
         try:
-            service = build("customsearch", "v1", developerKey=key)
-            results = service.cse().list(q=query, cx=config.CSE_ID).execute()
-        except Exception as e:
-            logging.exception(
-                "Error in fetching links from Google search: " + str(e))
-            results = {}
-        return results
+            for query, search in searches:
+                yield query, search.result()
+        finally:
+            for query, search in searches:
+                search.cancel()
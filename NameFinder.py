@@ -2,39 +2,41 @@
 
 import re
 import string
+from array import array
+from bisect import bisect_right
 import config
 from bs4 import BeautifulSoup
 
+# patterns are compiled once here since they run on every webpage (QueryGenerator also
+# removes dates and times from banners with DATE_TIME_REGEX)
+DATE_TIME_REGEX = re.compile(r'\d+[\/:\-]\d+[\/:\-\s]*[\dAaPpMn]*')
+LINE_SEPARATOR_REGEX = re.compile(r"\. ")
+PRODUCT_REGEX = re.compile(
+    r"\b[A-Za-z]+[-]?[A-Za-z]*[0-9]+[-]?[-]?[A-Za-z0-9]*\.?[0-9a-zA-Z]*\b")
+
 
 class NameFinder():
     def __init__(self, pageText):
-        dateTime = r'\d+[\/:\-]\d+[\/:\-\s]*[\dAaPpMn]*'
-        self.pageText = re.sub(dateTime, '', pageText)
-        self.idxtoLineNoMap = {}
+        self.pageText = DATE_TIME_REGEX.sub('', pageText)
+        self.lineStartIdxes = array('l')
 
-    def createIdxtoLineNoMap(self, text):
+    def createLineIndex(self, text):
         ''' 
-        This function creates a dictionary that maps webpage text lines to their line number.
+        This function creates a sorted array of the offsets at which webpage text lines start.
         :param text: A string containing webpage text
-        :return: A dictionary that maps webage text lines to their line numbers
+        :return: None. The array is stored in self.lineStartIdxes and queried with lineNoAt
         '''
-        lineStartIdxes = [m.start(0) + len(m.group(0))
-                          for m in re.finditer(r"\. ", text)]
-        prevIdx = 0
-        lineNum = 0
-        idxtoLineNoMap = dict()
-
-        for idx in lineStartIdxes:
-            for idx in range(prevIdx, idx):
-                idxtoLineNoMap[idx] = lineNum
-            prevIdx = idx
-            lineNum += 1
-
-        # Map entry for the last line
-        for idx in range(prevIdx, len(text) + 1):
-            idxtoLineNoMap[idx] = lineNum
+        # a line starts at the space of its preceding ". " separator
+        self.lineStartIdxes = array(
+            'l', [m.end(0) - 1 for m in LINE_SEPARATOR_REGEX.finditer(text)])
 
-        self.idxtoLineNoMap = idxtoLineNoMap
+    def lineNoAt(self, idx):
+        ''' 
+        This function finds the line number of an offset in the webpage text.
+        :param idx: An int offset into the webpage text
+        :return: An int containing the line number of the offset
+        '''
+        return bisect_right(self.lineStartIdxes, idx)
 
     def linefy(self, text):
         ''' 
@@ -45,7 +47,7 @@ class NameFinder():
         text = text.replace(".\n", ". ")
         text = text.replace("\n", ". ")
         text = text.replace("\\n", ". ")
-        self.createIdxtoLineNoMap(text)
+        self.createLineIndex(text)
         return text, text.split(". ")
 
     def findProducts(self, text):
@@ -54,9 +56,7 @@ class NameFinder():
         :param text: A string containing a line of webpage text.
         :return: A list of strings containing product names
         '''
-        p = re.compile(
-            r"\b[A-Za-z]+[-]?[A-Za-z]*[0-9]+[-]?[-]?[A-Za-z0-9]*\.?[0-9a-zA-Z]*\b")
-        prods = list(set(p.findall(text)))
+        prods = list(set(PRODUCT_REGEX.findall(text)))
         foundProds = self.findItemsInText(text, prods)
         return foundProds
 
@@ -70,10 +70,20 @@ class NameFinder():
         for item in items:
             if item in text:
                 itemRegex = "\\b" + item + "\\b"
-                found = found + [(item, m.start(0), self.idxtoLineNoMap[m.start(0)])
+                found = found + [(item, m.start(0), self.lineNoAt(m.start(0)))
                                  for m in re.finditer(itemRegex, text)]
         return found
 
+    def findItemsWithMatcher(self, text, itemMatcher):
+        ''' 
+        This function extracts items of several lists from a line of webpage text in a single pass.
+        :param text: A string containing a line of webpage text.
+        :param itemMatcher: An ItemMatcher built over the item lists
+        :return: A list (one entry per item list) of lists of strings containing items
+        '''
+        return [[(item, start, self.lineNoAt(start)) for item, start in found]
+                for found in itemMatcher.findAll(text)]
+
     def findAnnotations(
             self,
             linefiedData,
@@ -149,18 +159,23 @@ class NameFinder():
 
         return annotations
 
-    def extractInfo(self, devices, vendors):
+    def extractInfo(self, devices, vendors, itemMatcher=None):
         ''' 
         This function extracts annotations (device type, vendor, product) from webpage text by matching them
         with a pre-compiled list of device types and vendor names.
         :param devices: A pre-compiled list of device types
         :param vendors: A pre-compiled list of vendor name
+        :param itemMatcher: An optional ItemMatcher prebuilt from devices and vendors
         :return: list of strings containing annotations, and bools specifying if devices, vendors, 
                  products, both device and vendor, or all three are found from webpage text.
         '''
         joinedData, linefiedData = self.linefy(self.pageText.lower())
-        devicesInText = self.findItemsInText(joinedData, devices)
-        vendorsInText = self.findItemsInText(joinedData, vendors)
+        if itemMatcher is None:
+            devicesInText = self.findItemsInText(joinedData, devices)
+            vendorsInText = self.findItemsInText(joinedData, vendors)
+        else:
+            devicesInText, vendorsInText = self.findItemsWithMatcher(
+                joinedData, itemMatcher)
         productsInText = self.findProducts(joinedData)
 
         devicesFound = False
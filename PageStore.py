@@ -0,0 +1,96 @@
+""" Store crawled pages by content hash with a manifest mapping URLs to them """
+
+import hashlib
+import json
+import os
+
+
+class PageStore():
+    def __init__(self, path):
+        '''
+        This function opens (or creates) a page store.
+        :param path: A string containing the path of the page store directory
+        '''
+        self.path = path
+        self.blobsPath = os.path.join(path, "blobs")
+        self.manifestFileName = os.path.join(path, "manifest.jsonl")
+        self.manifest = None
+        if not os.path.exists(self.blobsPath):
+            os.makedirs(self.blobsPath)
+
+    def hash(self, text):
+        '''
+        This function computes the hash used to address URLs and page contents.
+        :param text: A string
+        :return: A string containing the hex SHA-256 digest of the text
+        '''
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def getManifest(self):
+        '''
+        This function returns the manifest, reading it from disk on first use.
+        :return: A dictionary that maps URLs to the content hashes of their pages
+        '''
+        if self.manifest is None:
+            self.manifest = {}
+            if os.path.exists(self.manifestFileName):
+                with open(self.manifestFileName, encoding="utf-8") as manifestFile:
+                    for line in manifestFile:
+                        record = json.loads(line)
+                        self.manifest[record["url"]] = record["blob"]
+        return self.manifest
+
+    def has(self, url):
+        '''
+        This function checks if the page of a URL is stored.
+        :param url: A string containing the URL
+        :return: True if the page is stored or else False
+        '''
+        return url in self.getManifest()
+
+    def getBlob(self, url):
+        '''
+        This function returns the content hash of the page of a URL.
+        :param url: A string containing the URL
+        :return: A string containing the content hash, or None if the page is not stored
+        '''
+        return self.getManifest().get(url)
+
+    def blobFileName(self, blob):
+        '''
+        This function returns the path of a stored page content.
+        :param blob: A string containing the content hash
+        :return: A string containing the path of the blob file
+        '''
+        return os.path.join(self.blobsPath, blob)
+
+    def read(self, blob):
+        '''
+        This function reads a stored page content.
+        :param blob: A string containing the content hash
+        :return: A string containing the page text
+        '''
+        with open(self.blobFileName(blob), "rb") as blobFile:
+            return blobFile.read().decode("utf-8")
+
+    def put(self, url, text):
+        '''
+        This function stores the page of a URL; identical contents are stored once.
+        :param url: A string containing the URL
+        :param text: A string containing the page text
+        :return: A string containing the content hash of the page
+        '''
+        blob = self.hash(text)
+        blobFileName = self.blobFileName(blob)
+        if not os.path.exists(blobFileName):
+            # write to a temporary file first so that readers never see partial blobs
+            tmpFileName = blobFileName + "." + self.hash(url) + ".tmp"
+            with open(tmpFileName, "w", encoding="utf-8") as blobFile:
+                blobFile.write(text)
+            os.replace(tmpFileName, blobFileName)
+
+        with open(self.manifestFileName, "a", encoding="utf-8") as manifestFile:
+            manifestFile.write(json.dumps(
+                {"url": url, "urlHash": self.hash(url), "blob": blob}) + "\n")
+        self.getManifest()[url] = blob
+        return blob
@@ -1,35 +1,113 @@
 """ Take a banner and generate all possible queries from it """
 
-from staticLists.devices import devices
-from staticLists.vendors import vendors
+from staticLists.vocabulary import vocabulary
 import re
 import enchant
 import random
 import json
 import functools
+import hashlib
+import os
+from collections import Counter
+import html
 import config
+from NameFinder import DATE_TIME_REGEX
+import numpy as np
 from bs4 import BeautifulSoup
 from sklearn.feature_extraction import stop_words
 from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.feature_extraction.text import TfidfTransformer
 import logging
+import multiprocessing
+
+# patterns are compiled once here since the refiners run on every banner
+HTTP_ERROR_CODES = [
+    "400 bad request",
+    "401 unauthorized",
+    "402 payment required",
+    "403 forbidden",
+    "404 not found",
+    "405 method not allowed",
+    "406 not acceptable",
+    "407 proxy authentication required",
+    "408 request timeout",
+    "409 conflict",
+    "410 gone",
+    "411 length required",
+    "412 precondition failed",
+    "413 request entity too large",
+    "414 request-uri too long",
+    "415 unsupported media type",
+    "416 request range not satisfiable",
+    "417 expectation failed",
+    "500 internet server error",
+    "501 not implemented",
+    "502 bad gateway",
+    "503 service unavailable",
+    "504 gateway timeout",
+    "505 http version not supported"]
+
+# keywords for common heavyweight webservers
+HEAVY_WEBSERVERS = [
+    "apache",
+    "iis",
+    "nginx"]
+
+# HTTP banners containing any of these are not processed
+HTTP_DISCARD_REGEX = re.compile(
+    "|".join(re.escape(keyword) for keyword in HTTP_ERROR_CODES + HEAVY_WEBSERVERS))
+
+SCRIPT_REGEX = re.compile(r"(?is)<script[^>]*>(.*?)</script>")
+STYLE_REGEX = re.compile(r"(?is)<style[^>]*>(.*?)</style>")
+HTTPS_LINK_REGEX = re.compile(r'^https?:\/\/.*[\r\n]*')
+HTTP_LINK_REGEX = re.compile(r'^http?:\/\/.*[\r\n]*')
+TAG_REGEX = re.compile('<[^<]+?>')
+# comments, CDATA sections and declarations/processing instructions, which html.parser
+# leaves out of the text, except for the content of CDATA sections
+MARKUP_REGEX = re.compile(r"<!--.*?-->|<!\[CDATA\[(.*?)\]\]>|<[!?][^>]*>",
+                          re.DOTALL | re.IGNORECASE)
+HTML_SPACES = " \n\t\f\r"
+UUID_REGEX = re.compile(
+    r'\b[0-9a-z]{8}\b-[0-9a-z]{4}-[0-9a-z]{4}-[0-9a-z]{4}-\b[0-9a-z]{12}\b')
+NON_ASCII_REGEX = re.compile(r"[^\x00-\x7F]+")
+
+# words found in a larger fraction of banners are not used as query keywords
+MAX_DOCUMENT_FREQUENCY = 0.85
+
+# query generator of a banner cleaning worker process
+cleaningGenerator = None
+
+
+def initCleaningWorker():
+    '''
+    This function prepares a process for cleaning banners.
+    :return: None. The query generator (and its dictionary) is created once per process
+    '''
+    global cleaningGenerator
+    cleaningGenerator = QueryGenerator()
+
+
+def cleanBannersTask(tasks):
+    '''
+    This function cleans a chunk of banners in a cleaning worker process.
+    :param tasks: A list of tuples containing the banners' texts and types
+    :return: A tuple containing a list of the cleaned banner texts and the numbers of dictionary
+             word cache hits and misses while cleaning them
+    '''
+    before = cleaningGenerator.isDictionaryWord.cache_info()
+    cleanedBanners = [cleaningGenerator.cleanBanner(bannerText, bannerType)
+                      for bannerText, bannerType in tasks]
+    after = cleaningGenerator.isDictionaryWord.cache_info()
+    return cleanedBanners, after.hits - before.hits, after.misses - before.misses
 
 
 class QueryGenerator():
     def __init__(self):
-        self.wordsToNotDiscard = []
-
-        for device in devices:
-            words = device.split(" ")
-            for word in words:
-                if word not in self.wordsToNotDiscard:
-                    self.wordsToNotDiscard.append(word)
-
-        for vendor in vendors:
-            words = vendor.split(" ")
-            for word in words:
-                if word not in self.wordsToNotDiscard:
-                    self.wordsToNotDiscard.append(word)
+        self.dictionary = enchant.Dict('en_US')
+        # banner tokens repeat a lot, so dictionary verdicts are memoized
+        self.isDictionaryWord = functools.lru_cache(
+            maxsize=config.DICTIONARY_CACHE_SIZE)(self.checkDictionaryWord)
+        self.wordsToNotDiscard = vocabulary
 
     def refineFTP(self, text):
         '''
@@ -76,75 +154,50 @@ class QueryGenerator():
             "306 (unused)",
             "307 temporary redirect"]
 
-        HTTPErrorCodes = [
-            "400 bad request",
-            "401 unauthorized",
-            "402 payment required",
-            "403 forbidden",
-            "404 not found",
-            "405 method not allowed",
-            "406 not acceptable",
-            "407 proxy authentication required",
-            "408 request timeout",
-            "409 conflict",
-            "410 gone",
-            "411 length required",
-            "412 precondition failed",
-            "413 request entity too large",
-            "414 request-uri too long",
-            "415 unsupported media type",
-            "416 request range not satisfiable",
-            "417 expectation failed",
-            "500 internet server error",
-            "501 not implemented",
-            "502 bad gateway",
-            "503 service unavailable",
-            "504 gateway timeout",
-            "505 http version not supported"]
-        # keywords for common heavyweight webservers
-        heavyWebservers = [
-            "apache",
-            "iis",
-            "nginx"]
-
-        """
-        Do not process the banner if the HTTP response is an error
-        """
-        if any([errorCode in text for errorCode in HTTPErrorCodes]):
-            return ""
-
         """
-        Do not process the banner if it contains heavyweight webservers
+        Do not process the banner if the HTTP response is an error or if it contains
+        heavyweight webservers
         """
-        if any([webserver in text for webserver in heavyWebservers]):
+        if HTTP_DISCARD_REGEX.search(text):
             return ""
 
         for code in HTTPNonErrorCodes:
             text.replace(code.lower(), "")
 
-        patScript = r"(?is)<script[^>]*>(.*?)</script>"
-        text = re.sub(patScript, "", text)
-
-        patStyle = r"(?is)<style[^>]*>(.*?)</style>"
-        text = re.sub(patStyle, "", text)
-
-        patLinks = r'^https?:\/\/.*[\r\n]*'
-        text = re.sub(patLinks, "", text)
-
-        patLinks = r'^http?:\/\/.*[\r\n]*'
-        text = re.sub(patLinks, "", text)
-
-        reg = re.compile('<[^<]+?>')
-        text = re.sub(reg, '', text)
-
-        dateTime = r'\d+[\/:\-]\d+[\/:\-\s]*[\dAaPpMn]*'
-        text = re.sub(dateTime, '', text)
+        text = SCRIPT_REGEX.sub("", text)
+        text = STYLE_REGEX.sub("", text)
+        text = HTTPS_LINK_REGEX.sub("", text)
+        text = HTTP_LINK_REGEX.sub("", text)
+        text = TAG_REGEX.sub("", text)
+        text = DATE_TIME_REGEX.sub("", text)
 
-        soup = BeautifulSoup(text, 'html.parser')
-        text = soup.text
+        text = self.extractHTMLText(text)
 
         return text
 
+    def extractHTMLText(self, text):
+        '''
+        This function extracts the text of HTML banner content whose tags are already removed.
+        :param text: A string of banner text
+        :return: A string of banner text without comments and declarations, with HTML entities unescaped
+        '''
+        if config.HTML_TEXT_EXTRACTOR == "beautifulsoup":
+            soup = BeautifulSoup(text, 'html.parser')
+            return soup.text
+
+        # split() alternates the text between markup with the content of CDATA sections (None
+        # for other markup), which is not unescaped
+        strings = []
+        for i, string in enumerate(MARKUP_REGEX.split(text)):
+            if i % 2 == 0:
+                string = html.unescape(string)
+            if string:
+                # BeautifulSoup collapses strings of only whitespace
+                if not string.strip(HTML_SPACES):
+                    string = "\n" if "\n" in string else " "
+                strings.append(string)
+        return "".join(strings)
+
     def refineUPNP(self, text):
         '''
         This function refines UPNP banner text.
@@ -152,10 +205,7 @@ class QueryGenerator():
         :return: a string of refined banner text
         '''
         # remove uuid
-        UUIDRemovedBanner = re.sub(
-            r'\b[0-9a-z]{8}\b-[0-9a-z]{4}-[0-9a-z]{4}-[0-9a-z]{4}-\b[0-9a-z]{12}\b',
-            "",
-            text)
+        UUIDRemovedBanner = UUID_REGEX.sub("", text)
 
         # remove date
         splitted = UUIDRemovedBanner.split("\r")
@@ -178,7 +228,7 @@ class QueryGenerator():
         :param text: A string of banner text
         :return: a string of refined banner text
         '''
-        text = re.sub(r"[^\x00-\x7F]+", " ", text)
+        text = NON_ASCII_REGEX.sub(" ", text)
         text = text.rstrip('\0')
         return text
 
@@ -231,13 +281,20 @@ class QueryGenerator():
             word for word in words if word not in stop_words.ENGLISH_STOP_WORDS]
         return " ".join(filteredWords)
 
+    def checkDictionaryWord(self, word):
+        '''
+        This function checks if a word is an English dictionary word.
+        :param word: A lowercase string
+        :return: True if the word is in the en_US dictionary or else False
+        '''
+        return self.dictionary.check(word)
+
     def removeDictionaryWords(self, text):
         '''
         This function removes dictionary words from a string.
         :param word: A string
         :return: A string with dictionary words removed
         '''
-        dictionary = enchant.Dict('en_US')
         words = [word for word in text.split(" ") if word]
         relevantWords = []
         for word in words:
@@ -246,7 +303,7 @@ class QueryGenerator():
                 relevantWords.append(cleanWord)
                 continue
             try:
-                if not dictionary.check(cleanWord.lower()):
+                if not self.isDictionaryWord(cleanWord.lower()):
                     relevantWords.append(cleanWord)
                     continue
             except Exception as e:
@@ -285,6 +342,31 @@ class QueryGenerator():
         tuples = zip(cooMatrix.col, cooMatrix.data)
         return sorted(tuples, key=lambda x: (x[1], x[0]), reverse=True)
 
+    def sortCsrRow(self, tfidfMatrix, row, topn):
+        '''
+        This function sorts the top n items of a CSR matrix row in the order sortCoo sorts a vector.
+        :param tfidfMatrix: A CSR matrix of tf-idf scores
+        :param row: An int specifying the row to sort
+        :param topn: An int specifying number of top items to keep
+        :return: A list of (word index, tf-idf score) tuples sorted by score and then word index, descending
+        '''
+        if topn <= 0:
+            return []
+        start = tfidfMatrix.indptr[row]
+        end = tfidfMatrix.indptr[row + 1]
+        cols = tfidfMatrix.indices[start:end]
+        scores = tfidfMatrix.data[start:end]
+
+        if len(scores) > topn:
+            # keep every item tied with the n-th highest score so that ties are broken as in sortCoo
+            threshold = np.partition(scores, len(scores) - topn)[len(scores) - topn]
+            candidates = scores >= threshold
+            cols = cols[candidates]
+            scores = scores[candidates]
+
+        order = np.lexsort((cols, scores))[::-1][:topn]
+        return list(zip(cols[order].tolist(), scores[order].tolist()))
+
     def extractTopnFromVector(self, featureNames, sortedItems, topn=10):
         '''
         This function obtains the feature names and tf-idf score of top n items.
@@ -308,21 +390,48 @@ class QueryGenerator():
 
         return results
 
+    def cleanBanners(self, banners):
+        '''
+        This function cleans all banners, in a pool of worker processes if configured.
+        :param banners: A list of all banners
+        :return: A list of strings containing the cleaned banner texts, in the order of banners
+        '''
+        if config.CLEANING_WORKERS == 1 or len(banners) <= config.CLEANING_CHUNK_SIZE:
+            cleanedBanners = []
+            for banner in banners:
+                bannerType = banner["type"]
+                bannerText = banner["banner"]
+                cleanedBanner = self.cleanBanner(bannerText, bannerType)
+                cleanedBanners.append(cleanedBanner)
+            logging.info("Dictionary word cache: " +
+                         str(self.isDictionaryWord.cache_info()))
+            return cleanedBanners
+
+        tasks = [(banner["banner"], banner["type"]) for banner in banners]
+        chunks = [tasks[i:i + config.CLEANING_CHUNK_SIZE]
+                  for i in range(0, len(tasks), config.CLEANING_CHUNK_SIZE)]
+        cleanedBanners = []
+        hits = misses = 0
+        with multiprocessing.Pool(config.CLEANING_WORKERS, initializer=initCleaningWorker) as pool:
+            for chunkCleanedBanners, chunkHits, chunkMisses in pool.imap(cleanBannersTask, chunks):
+                cleanedBanners.extend(chunkCleanedBanners)
+                hits += chunkHits
+                misses += chunkMisses
+        # each worker has its own cache, so these are the totals over all workers
+        logging.info("Dictionary word cache: hits=" + str(hits) + ", misses=" + str(misses) +
+                     " over " + str(config.CLEANING_WORKERS) + " workers")
+        return cleanedBanners
+
     def generateForAll(self, banners):
         '''
         This function extracts queries from all banners.
         :param banners: A list of all banners
         :return: A dictionary mapping banners to their query keywords.
         '''
-        cleanedBanners = []
-        for banner in banners:
-            bannerType = banner["type"]
-            bannerText = banner["banner"]
-            cleanedBanner = self.cleanBanner(bannerText, bannerType)
-            cleanedBanners.append(cleanedBanner)
+        cleanedBanners = self.cleanBanners(banners)
 
         cv = CountVectorizer(
-            max_df=0.85,
+            max_df=MAX_DOCUMENT_FREQUENCY,
             analyzer=self.splitOnSpace,
             stop_words='english')
         wordCountVector = cv.fit_transform(cleanedBanners)
@@ -330,12 +439,94 @@ class QueryGenerator():
         tfidfTransformer.fit(wordCountVector)
         featureNames = cv.get_feature_names()
 
+        # transform all banners at once; rows of the CSR result are the banner vectors
+        tfidfMatrix = tfidfTransformer.transform(wordCountVector).tocsr()
+
         bannersToKeywords = dict()
-        for i, banner in enumerate(cleanedBanners):
-            tfidfVector = tfidfTransformer.transform(cv.transform([banner]))
-            sortedItems = self.sortCoo(tfidfVector.tocoo())
+        for i in range(len(cleanedBanners)):
+            sortedItems = self.sortCsrRow(tfidfMatrix, i, config.TOP_K_WORDS)
             keywords = self.extractTopnFromVector(
                 featureNames, sortedItems, config.TOP_K_WORDS)
             bannersToKeywords[banners[i]["banner"]] = " ".join(keywords.keys())
 
         return bannersToKeywords
+
+    def hashBanner(self, bannerText):
+        '''
+        This function computes the key of a banner in the query generator state.
+        :param bannerText: A string containing banner's text
+        :return: A string containing the hex SHA-256 digest of the banner text
+        '''
+        return hashlib.sha256(bannerText.encode("utf-8")).hexdigest()
+
+    def loadState(self, fileName):
+        '''
+        This function reads the query generator state saved by an earlier incremental run.
+        :param fileName: A string containing the path of the state file
+        :return: A dictionary containing the number of banners seen ("numBanners"), the number of
+                 banners every word was found in ("documentFrequencies") and the queries of the
+                 banners seen by banner hash ("queries")
+        '''
+        if not os.path.exists(fileName):
+            return {"numBanners": 0, "documentFrequencies": {}, "queries": {}}
+        with open(fileName, encoding="utf-8") as stateFile:
+            return json.load(stateFile)
+
+    def saveState(self, state, fileName):
+        '''
+        This function saves the query generator state for the next incremental run.
+        :param state: A dictionary containing the query generator state (see loadState)
+        :param fileName: A string containing the path of the state file
+        :return: None
+        '''
+        # write to a temporary file first so that an interrupted run keeps the previous state
+        with open(fileName + ".tmp", "w", encoding="utf-8") as stateFile:
+            json.dump(state, stateFile)
+        os.replace(fileName + ".tmp", fileName)
+
+    def generateIncrementally(self, banners, state):
+        '''
+        This function extracts queries from the banners not seen by earlier runs, after adding them
+        to the document frequencies of the state. Queries of banners seen earlier are not regenerated.
+        Run on an empty state, it extracts the same queries as generateForAll.
+        :param banners: A list of all banners
+        :param state: A dictionary containing the query generator state (see loadState), updated in place
+        :return: A dictionary mapping banners to their query keywords.
+        '''
+        queries = state["queries"]
+        newBanners = [banner for banner in banners
+                      if self.hashBanner(banner["banner"]) not in queries]
+        if not newBanners:
+            return {banner["banner"]: queries[self.hashBanner(banner["banner"])]
+                    for banner in banners}
+
+        cleanedBanners = self.cleanBanners(newBanners)
+        wordCounts = [Counter(self.splitOnSpace(cleanedBanner))
+                      for cleanedBanner in cleanedBanners]
+
+        documentFrequencies = state["documentFrequencies"]
+        for counts in wordCounts:
+            for word in counts:
+                documentFrequencies[word] = documentFrequencies.get(word, 0) + 1
+        state["numBanners"] += len(newBanners)
+        numBanners = state["numBanners"]
+
+        # vocabulary and smoothed idf as fitted by CountVectorizer and TfidfTransformer
+        maxDocCount = MAX_DOCUMENT_FREQUENCY * numBanners
+        featureNames = sorted(word for word, df in documentFrequencies.items()
+                              if df <= maxDocCount)
+        featureIdxes = {word: idx for idx, word in enumerate(featureNames)}
+
+        for banner, counts in zip(newBanners, wordCounts):
+            # l2 normalization scales a whole row, so it does not change the order of its words
+            sortedItems = sorted(
+                [(featureIdxes[word],
+                  count * (np.log((numBanners + 1) / (documentFrequencies[word] + 1)) + 1))
+                 for word, count in counts.items() if word in featureIdxes],
+                key=lambda x: (x[1], x[0]), reverse=True)
+            keywords = self.extractTopnFromVector(
+                featureNames, sortedItems, config.TOP_K_WORDS)
+            queries[self.hashBanner(banner["banner"])] = " ".join(keywords.keys())
+
+        return {banner["banner"]: queries[self.hashBanner(banner["banner"])]
+                for banner in banners}
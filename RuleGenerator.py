@@ -1,17 +1,29 @@
 """ Takes in transactions and generates rules """
 
-from apyori import apriori
-import pandas as pd
-import csv
+from ItemsetMiner import ItemsetMiner, RelationRecord, OrderedStatistic
+from InternedTransactions import InternedTransactions
+from collections import Counter
+from itertools import combinations
+from RulesWriter import RulesWriter, RULES_COLUMNS
 import config
 from staticLists.devices import devices
 from staticLists.vendors import vendors
 
+# hashed lookups of the item kinds other than banners
+DEVICES = frozenset(devices)
+VENDORS = frozenset(vendors)
+# kinds of the items of a rule, in the order of rule keys
+RULE_KINDS = ("banner", "deviceType", "vendor", "product")
+
 
 class RuleGenerator():
     def __init__(self, transactions):
+        # rules are mined over integer item ids and only decoded for labeling
+        if not isinstance(transactions, InternedTransactions):
+            transactions = InternedTransactions(transactions)
         self.transactions = transactions
-        self.banners = list(set([x[0] for x in transactions]))
+        self.bannerIds = transactions.getFirstItemIds()
+        self.banners = set(transactions.decode(self.bannerIds))
 
     def getLabeledRule(self, relationRecord):
         ''' 
@@ -23,9 +35,9 @@ class RuleGenerator():
         for item in items:
             if item in self.banners:
                 rule["banner"] = item
-            elif item in devices:
+            elif item in DEVICES:
                 rule["deviceType"] = item
-            elif item in vendors:
+            elif item in VENDORS:
                 rule["vendor"] = item
             else:
                 rule["product"] = item
@@ -35,32 +47,121 @@ class RuleGenerator():
 
         return rule
 
-    def generate(self):
-        ''' 
-        This function generates rules from transactions.
-        :return: A list of dictionaries containing rules
+    def getRuleKey(self, rule):
+        '''
+        This function computes a hashable key that equal rules share.
+        :param rule: A dictionary containing rule
+        :return: A tuple of the banner, device type, vendor and product of the rule (None if missing)
+        '''
+        return tuple(rule.get(kind) for kind in RULE_KINDS)
+
+    def countItemsets(self, minSupport):
+        '''
+        This function counts the transactions containing every itemset that may be frequent.
+        Transactions are grouped in a single pass, so repeated transactions are expanded once.
+        Transactions hold a banner and at most a device type, a vendor and a product, so each
+        has at most 15 itemsets.
+        :param minSupport: A float containing the minimum support of an itemset
+        :return: A Counter that maps sorted tuples of item ids to the number of transactions
+                 containing them, for all frequent itemsets (and some infrequent ones)
+        '''
+        numTransactions = len(self.transactions)
+        transactionCounts = Counter(tuple(sorted(set(transaction)))
+                                    for transaction in self.transactions)
+
+        itemCounts = Counter()
+        for items, count in transactionCounts.items():
+            for item in items:
+                itemCounts[item] += count
+        # itemsets with an infrequent item are infrequent
+        counts = Counter({(item,): count for item, count in itemCounts.items()
+                          if float(count) / numTransactions >= minSupport})
+
+        for items, count in transactionCounts.items():
+            items = [item for item in items if (item,) in counts]
+            for length in range(2, len(items) + 1):
+                for itemset in combinations(items, length):
+                    counts[itemset] += count
+        return counts
+
+    def mineBannerRules(self, minSupport, minConfidence):
+        '''
+        This function finds the frequent itemsets containing a banner, with at least one rule of
+        enough confidence, as ItemsetMiner.mine finds them (itemsets without a banner are left out).
+        :param minSupport: A float containing the minimum support of an itemset
+        :param minConfidence: A float containing the minimum confidence of a rule
+        :return: A generator of RelationRecord tuples, in the order ItemsetMiner.mine produces them
         '''
-        rules = []
-        results = list(apriori(self.transactions,
-                               min_support=config.MIN_SUPPORT,
-                               min_confidence=config.MIN_CONFIDENCE))
+        if minSupport <= 0:
+            raise ValueError('minimum support must be > 0')
+
+        counts = self.countItemsets(minSupport)
+        numTransactions = len(self.transactions)
+        supports = {}
+        for itemset, count in counts.items():
+            support = float(count) / numTransactions
+            if support >= minSupport:
+                supports[itemset] = support
+
+        bannerItemsets = [itemset for itemset in supports
+                          if any(item in self.bannerIds for item in itemset)]
+        bannerItemsets.sort(key=lambda itemset: (len(itemset), itemset))
+
+        for itemset in bannerItemsets:
+            support = supports[itemset]
+            orderedStatistics = []
+            for baseLength in range(len(itemset)):
+                for base in combinations(itemset, baseLength):
+                    add = tuple(item for item in itemset if item not in base)
+                    confidence = support / (supports[base] if base else 1.0)
+                    if confidence < minConfidence:
+                        continue
+                    orderedStatistics.append(OrderedStatistic(
+                        frozenset(base), frozenset(add), confidence, confidence / supports[add]))
+            if orderedStatistics:
+                yield RelationRecord(frozenset(itemset), support, orderedStatistics)
+
+    def generate(self, dataFrame=False):
+        '''
+        This function generates rules from transactions, writing them to the rules files as they are found.
+        :param dataFrame: True to return the rules as a pandas DataFrame
+        :return: A list of dictionaries containing rules, or a DataFrame of their Items, Support and
+                 Confidence if dataFrame is True
+        '''
+        if config.RULE_ENGINE == "banner":
+            results = self.mineBannerRules(
+                config.MIN_SUPPORT, config.MIN_CONFIDENCE)
+        else:
+            results = ItemsetMiner(self.transactions).mine(
+                config.MIN_SUPPORT, config.MIN_CONFIDENCE)
         Support = []
         Confidence = []
         Items = []
-        for RelationRecord in results:
-            for ordered_stat in RelationRecord.ordered_statistics:
-                itemsAsSet = self.getLabeledRule(RelationRecord.items)
-                if itemsAsSet is not None and itemsAsSet not in Items:
+        ruleKeys = set()
+        rulesWriter = RulesWriter(
+            config.RULES_FILE, config.RULES_JSONL_FILE, config.RULES_PARQUET_FILE)
+        try:
+            for record in results:
+                items = frozenset(self.transactions.decode(sorted(record.items)))
+                itemsAsSet = self.getLabeledRule(items)
+                if itemsAsSet is None:
+                    continue
+                ruleKey = self.getRuleKey(itemsAsSet)
+                # a rule is kept once, with the confidence of the first statistic of its first itemset
+                if ruleKey not in ruleKeys:
+                    ruleKeys.add(ruleKey)
+                    confidence = record.ordered_statistics[0].confidence
+                    rulesWriter.write(itemsAsSet, record.support, confidence)
                     Items.append(itemsAsSet)
-                    Support.append(RelationRecord.support)
-                    Confidence.append(ordered_stat.confidence)
-
-        # represent Items, Support, and Confidence as dataframes
-        df = pd.DataFrame(columns=('Items', 'Support', 'Confidence'))
-        df['Items'], df['Support'], df['Confidence'] = Items, Support, Confidence
-        
-        # generates a rules.csv file containing the inferred rules
-        rules = df['Items']
-        df.to_csv(config.RULES_FILE)
+                    if dataFrame:
+                        Support.append(record.support)
+                        Confidence.append(confidence)
+        finally:
+            rulesWriter.close()
+
+        if dataFrame:
+            import pandas as pd
+            return pd.DataFrame({'Items': Items, 'Support': Support, 'Confidence': Confidence},
+                                columns=RULES_COLUMNS)
 
         return Items
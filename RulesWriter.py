@@ -0,0 +1,90 @@
+""" Write rules to the rules files as they are generated """
+
+import csv
+import json
+import os
+
+# columns of the rules files; rules.csv also starts with an unnamed rule number column
+RULES_COLUMNS = ["Items", "Support", "Confidence"]
+
+
+class RulesWriter():
+    def __init__(self, csvFileName, jsonlFileName=None, parquetFileName=None, batchSize=10000):
+        '''
+        This function opens the rules files. The CSV file has the layout pandas' DataFrame.to_csv
+        writes (",Items,Support,Confidence" header, rule numbers as the first column) that analyze.py reads.
+        :param csvFileName: A string containing the path of the rules CSV file
+        :param jsonlFileName: A string containing the path of a rules JSON Lines file (None writes none)
+        :param parquetFileName: A string containing the path of a rules Parquet file (None writes none);
+                                requires pyarrow
+        :param batchSize: An int containing the number of rules per Parquet row group
+        '''
+        self.numRules = 0
+        self.csvFile = open(csvFileName, "w", newline="", encoding="utf-8")
+        self.csvWriter = csv.writer(self.csvFile, lineterminator=os.linesep)
+        self.csvWriter.writerow([""] + RULES_COLUMNS)
+
+        self.jsonlFile = None
+        if jsonlFileName is not None:
+            self.jsonlFile = open(jsonlFileName, "w", encoding="utf-8")
+
+        self.parquetWriter = None
+        if parquetFileName is not None:
+            import pyarrow
+            import pyarrow.parquet
+            self.pyarrow = pyarrow
+            self.parquetSchema = pyarrow.schema([
+                ("Rule", pyarrow.int64()),
+                ("Items", pyarrow.string()),
+                ("Support", pyarrow.float64()),
+                ("Confidence", pyarrow.float64())])
+            self.parquetWriter = pyarrow.parquet.ParquetWriter(
+                parquetFileName, self.parquetSchema)
+            self.batchSize = batchSize
+            self.batch = {name: [] for name in self.parquetSchema.names}
+
+    def write(self, rule, support, confidence):
+        '''
+        This function appends a rule to the rules files.
+        :param rule: A dictionary containing rule
+        :param support: A float containing the support of the rule
+        :param confidence: A float containing the confidence of the rule
+        :return: None
+        '''
+        self.csvWriter.writerow([self.numRules, str(rule), support, confidence])
+
+        if self.jsonlFile is not None:
+            self.jsonlFile.write(json.dumps(
+                {"Rule": self.numRules, "Items": rule, "Support": support,
+                 "Confidence": confidence}) + "\n")
+
+        if self.parquetWriter is not None:
+            for name, value in zip(self.parquetSchema.names,
+                                   (self.numRules, str(rule), support, confidence)):
+                self.batch[name].append(value)
+            if len(self.batch["Rule"]) == self.batchSize:
+                self.flushParquet()
+
+        self.numRules += 1
+
+    def flushParquet(self):
+        '''
+        This function writes the buffered rules as a Parquet row group.
+        :return: None
+        '''
+        if self.batch["Rule"]:
+            self.parquetWriter.write_table(self.pyarrow.Table.from_pydict(
+                self.batch, schema=self.parquetSchema))
+            self.batch = {name: [] for name in self.parquetSchema.names}
+
+    def close(self):
+        '''
+        This function closes the rules files.
+        :return: None
+        '''
+        self.csvFile.close()
+        if self.jsonlFile is not None:
+            self.jsonlFile.close()
+        if self.parquetWriter is not None:
+            self.flushParquet()
+            self.parquetWriter.close()
@@ -0,0 +1,104 @@
+""" Persist search API results on disk so that repeated queries are not re-issued """
+
+import hashlib
+import json
+import sqlite3
+import time
+
+
+class SearchCache():
+    def __init__(self, fileName, ttl=None, maxEntries=None):
+        '''
+        This function opens (or creates) a search results cache.
+        :param fileName: A string containing the path of the SQLite cache file
+        :param ttl: Number of seconds after which cached results expire (None keeps them forever)
+        :param maxEntries: Maximum number of cached queries kept by evict (None keeps all)
+        '''
+        self.ttl = ttl
+        self.maxEntries = maxEntries
+        self.connection = sqlite3.connect(fileName)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, query TEXT, cseId TEXT, results TEXT, "
+            "created REAL, accessed REAL)")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS resultsAccessed ON results (accessed)")
+        self.connection.commit()
+
+    def normalize(self, query):
+        '''
+        This function normalizes a query so that equivalent queries share a cache entry.
+        :param query: A string containing query keywords
+        :return: A string containing the lowercased keywords separated by single spaces
+        '''
+        return " ".join(query.lower().split())
+
+    def makeKey(self, query, cseId):
+        '''
+        This function computes the cache key of a query.
+        :param query: A string containing query keywords
+        :param cseId: A string containing the custom search engine ID
+        :return: A string containing the hex SHA-256 digest of the CSE ID and normalized query
+        '''
+        content = cseId + "\n" + self.normalize(query)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get(self, query, cseId):
+        '''
+        This function looks up the cached results of a query.
+        :param query: A string containing query keywords
+        :param cseId: A string containing the custom search engine ID
+        :return: A dictionary containing the search API response, or None if not cached or expired
+        '''
+        key = self.makeKey(query, cseId)
+        row = self.connection.execute(
+            "SELECT results, created FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        now = time.time()
+        if self.ttl is not None and now - row[1] > self.ttl:
+            self.connection.execute("DELETE FROM results WHERE key = ?", (key,))
+            self.connection.commit()
+            return None
+
+        # access times are committed together with the next put, evict or close
+        self.connection.execute(
+            "UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, query, cseId, results):
+        '''
+        This function caches the results of a query.
+        :param query: A string containing query keywords
+        :param cseId: A string containing the custom search engine ID
+        :param results: A dictionary containing the search API response
+        :return: None
+        '''
+        now = time.time()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+            (self.makeKey(query, cseId), query, cseId, json.dumps(results), now, now))
+        self.connection.commit()
+
+    def evict(self):
+        '''
+        This function removes expired results and, beyond maxEntries, the least recently used ones.
+        :return: None
+        '''
+        if self.ttl is not None:
+            self.connection.execute(
+                "DELETE FROM results WHERE created < ?", (time.time() - self.ttl,))
+        if self.maxEntries is not None:
+            self.connection.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results "
+                "ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.maxEntries,))
+        self.connection.commit()
+
+    def close(self):
+        '''
+        This function closes the cache file.
+        :return: None
+        '''
+        self.connection.commit()
+        self.connection.close()
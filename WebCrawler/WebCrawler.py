@@ -1,9 +1,16 @@
 import scrapy
-import os
+import io
+import queue
 import sys
 import re
 import PyPDF2
+from scrapy import signals
+from scrapy.crawler import CrawlerProcess
+from scrapy.exceptions import DontCloseSpider
+from scrapy.settings import Settings
+from twisted.internet import task
 from utils import cleanTags, isEmptyLine
+from PageStore import PageStore
 import config
 sys.path.append('../../')
 
@@ -11,35 +18,99 @@ sys.path.append('../../')
 class PageSpider(scrapy.Spider):
     name = "WebCrawler"
 
-    def __init__(self, urlsFileName, outPath):
-        self.urls = list()
-        self.outPath = outPath
-        urlsFile = open(urlsFileName)
+    def __init__(self, urlsFileName=None, outPath=None, urls=None, resultQueue=None, urlQueue=None):
+        self.pageStore = PageStore(outPath)
+        # (url, status, content hash) tuples are put on resultQueue as pages are crawled
+        self.resultQueue = resultQueue
+        # in streaming mode more URLs arrive on urlQueue until it yields None
+        self.urlQueue = urlQueue
+        self.urlQueueDone = urlQueue is None
 
-        for line in urlsFile:
-            self.urls.append(line.rstrip())
+        if urls is None:
+            urls = []
+            if urlsFileName:
+                urls = [line.rstrip() for line in open(urlsFileName)]
+
+        self.urls = [url for url in urls if self.isNewUrl(url)]
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(PageSpider, cls).from_crawler(crawler, *args, **kwargs)
+        if spider.urlQueue is not None:
+            crawler.signals.connect(spider.onOpened, signal=signals.spider_opened)
+            crawler.signals.connect(spider.onIdle, signal=signals.spider_idle)
+        return spider
+
+    def onOpened(self, spider):
+        self.urlPoller = task.LoopingCall(self.scheduleQueuedUrls)
+        self.urlPoller.start(config.CRAWL_QUEUE_POLL_INTERVAL)
+
+    def onIdle(self, spider):
+        self.scheduleQueuedUrls()
+        if not self.urlQueueDone:
+            raise DontCloseSpider
+
+    def scheduleQueuedUrls(self):
+        # never block here, the reactor runs the downloads
+        while not self.urlQueueDone:
+            try:
+                url = self.urlQueue.get_nowait()
+            except queue.Empty:
+                break
+            if url is None:
+                self.urlQueueDone = True
+                if self.urlPoller.running:
+                    self.urlPoller.stop()
+                break
+            if self.isNewUrl(url):
+                self.crawler.engine.crawl(self.makeRequest(url), self)
+
+    def isNewUrl(self, url):
+        # pages of known URLs are already in the store
+        if self.pageStore.has(url):
+            self.report(url, "cached", self.pageStore.getBlob(url))
+            return False
+        return True
+
+    def report(self, url, status, blob):
+        if self.resultQueue is not None:
+            self.resultQueue.put((url, status, blob))
 
     def start_requests(self):
-        for index, url in enumerate(self.urls):
-            if url.endswith(".pdf"):
-                request = scrapy.Request(url=url, callback=self.parsePDF)
-            else:
-                request = scrapy.Request(url=url, callback=self.parseHTML)
-            request.meta["index"] = str(index)
-            yield request
+        for url in self.urls:
+            yield self.makeRequest(url)
+
+    def makeRequest(self, url):
+        if url.endswith(".pdf"):
+            request = scrapy.Request(
+                url=url, callback=self.parsePDF, errback=self.parseError)
+        else:
+            request = scrapy.Request(
+                url=url, callback=self.parseHTML, errback=self.parseError)
+        request.meta["url"] = url
+        return request
+
+    def storePage(self, response, getText):
+        url = response.meta.get("url")
+        try:
+            blob = self.pageStore.put(url, getText(response))
+        except Exception as e:
+            self.report(url, "failed: " + str(e), None)
+            raise
+        self.report(url, "crawled", blob)
+
+    def parseError(self, failure):
+        self.report(failure.request.meta.get("url"),
+                    "failed: " + repr(failure.value), None)
 
     def parsePDF(self, response):
-        outFileName = response.meta.get("index")
-        # temporarily save to disk for parsing
-        with open(os.path.join(self.outPath, outFileName + ".pdf"), "wb") as f:
-            f.write(response.body)
-        pdfFileObj = open(
-            os.path.join(
-                self.outPath,
-                outFileName +
-                ".pdf"),
-            'rb')
-        pdfReader = PyPDF2.PdfFileReader(pdfFileObj)
+        self.storePage(response, self.extractPDFText)
+
+    def parseHTML(self, response):
+        self.storePage(response, self.extractHTMLText)
+
+    def extractPDFText(self, response):
+        pdfReader = PyPDF2.PdfFileReader(io.BytesIO(response.body))
         allText = ""
         # only process the first k pages
         for pageNum in range(0,
@@ -47,11 +118,9 @@ class PageSpider(scrapy.Spider):
                                  pdfReader.numPages)):
             pageObj = pdfReader.getPage(pageNum)
             allText += pageObj.extractText()
-        with open(os.path.join(self.outPath, outFileName), "w") as f:
-            f.write(allText)
+        return allText
 
-    def parseHTML(self, response):
-        outFileName = response.meta.get("index")
+    def extractHTMLText(self, response):
         scripts = [cleanTags(s.get()) for s in response.css('script')]
         styles = [cleanTags(s.get()) for s in response.css('style')]
         textElements = [i.get() for i in response.css('::text')]
@@ -59,6 +128,24 @@ class PageSpider(scrapy.Spider):
             text for text in textElements if not isEmptyLine(text) and (
                 text not in scripts) and (
                 text not in styles)]
+        return "\n".join(filteredText)
+
 
-        with open(os.path.join(self.outPath, outFileName), "w", encoding="utf-8") as f:
-            f.write("\n".join(filteredText))
+def crawl(urls, resultQueue, urlQueue=None):
+    '''
+    This function crawls webpages in the calling process with the project settings.
+    The Twisted reactor cannot be restarted, so call it in a fresh process per crawl.
+    :param urls: A list of URLs to crawl
+    :param resultQueue: A multiprocessing queue receiving (url, status, content hash) tuples,
+                        followed by None once the crawl is finished
+    :param urlQueue: An optional multiprocessing queue of more URLs to crawl as they arrive, ended by None
+    :return: None. Crawled pages are saved in the config.PAGES_PATH page store
+    '''
+    settings = Settings()
+    settings.setmodule("WebCrawler.settings", priority="project")
+    settings.set("LOG_ENABLED", False)
+    process = CrawlerProcess(settings)
+    process.crawl(PageSpider, outPath=config.PAGES_PATH, urls=urls,
+                  resultQueue=resultQueue, urlQueue=urlQueue)
+    process.start()
+    resultQueue.put(None)
@@ -5,6 +5,7 @@ import ast
 import json
 import config
 import os
+from BannerReader import BannerReader
 
 totalBanners = 0
 equivalentDevTypes = {
@@ -152,6 +153,7 @@ def getRulesStats(rules, ruleNumToBannerMap):
 def createBannerToLabelsMap(inputDataset):
     '''
     This function creates a dictionary that maps banners to their labels for ground truth
+    :param inputDataset: An iterable of (banner ID, banner) tuples
     :return: A dictionary that maps banner to their labels.
     '''
     global totalBanners
@@ -163,7 +165,7 @@ def createBannerToLabelsMap(inputDataset):
             totalBanners += 1
 
     bannerToLabelsMap = dict()
-    for bannerID, item in inputDataset.items():
+    for bannerID, item in inputDataset:
         deviceTypes = []
         vendors = []
         products = []
@@ -380,7 +382,7 @@ def createLabeledFilteredRules(bannerToRuleLinesMap, ruleNumToBannerMap):
 
 
 if __name__ == "__main__":
-    inputDataset = json.load(open(config.BANNERS_FILE, encoding="utf8"))
+    inputDataset = BannerReader(config.BANNERS_FILE)
     rulesFile = open(config.RULES_FILE, encoding="utf8")
     rulesLabeledFile = open(
         os.path.join(
@@ -8,17 +8,27 @@ BANNERS_FILE = "../data/ferret_banners.json"
 # Number of banners to process (if not all)
 NUM_PROCESS_BANNERS = 129 
 
+# Banners to skip at the start of the banners file, and shard of the remaining
+# banners to process (banner # modulo NUM_BANNERS_SHARDS == BANNERS_SHARD)
+BANNERS_OFFSET = 0
+BANNERS_SHARD = 0
+NUM_BANNERS_SHARDS = 1
+
 # Absolute Path to intermediate log files and final rules file
 OUT_PATH = "/Users/testuser/out/"
 
 # Log files
 QUERY_LOG_FILE = os.path.join(OUT_PATH, "queryLog.txt")
+QUERY_STATE_FILE = os.path.join(OUT_PATH, "queryGeneratorState.json")
 LINKS_LOG_FILE = os.path.join(OUT_PATH, "linksLog.txt")
 DER_LOG_FILE = os.path.join(OUT_PATH, "derLog.txt")
-INTERMEDIATE_FILE = os.path.join(OUT_PATH, "intermediate.txt") 
+INTERMEDIATE_FILE = os.path.join(OUT_PATH, "intermediate.jsonl")
 URLS_FILE = os.path.join(OUT_PATH, "urls.txt") 
 RULES_LOG_FILE = os.path.join(OUT_PATH, "rulesLog.txt")
 RULES_FILE = os.path.join(OUT_PATH, "rules.csv")
+# Optional copies of the rules as JSON Lines and as Parquet (requires pyarrow); None writes none
+RULES_JSONL_FILE = None
+RULES_PARQUET_FILE = None
 STATS_FILE = os.path.join(OUT_PATH, "pipelineStats.txt")
 CORRECT_RULES_FILE = os.path.join(OUT_PATH, "correctRules.txt")
 
@@ -39,17 +49,60 @@ UNLIMITED_QUOTA = False # If using billed version
 QUOTA_PER_KEY = 100     
 
 # Parameters to implement the 100 requests per second rate limit
+# Each key gets a token bucket holding SEARCH_API_BATCH_SIZE tokens that refills
+# at SEARCH_API_BATCH_SIZE / SEARCH_API_WAIT_TIME tokens per second
 SEARCH_API_BATCH_SIZE = 100 
 SEARCH_API_WAIT_TIME = 100 #seconds
 
+# Number of concurrent search requests per key
+SEARCH_API_THREADS_PER_KEY = 4
+# Retries for a failed search request; the n-th retry waits SEARCH_API_BACKOFF * 2^n seconds
+SEARCH_API_RETRIES = 3
+SEARCH_API_BACKOFF = 1 #seconds
+# Discovery document URL of the search API (None uses Google's); {api} and
+# {apiVersion} are filled in. Point this to a local stub server to test
+# get_links without using the key quota.
+SEARCH_API_DISCOVERY_URL = None
+
+# Search results cache shared across runs (None disables it). Results are keyed on
+# the normalized query and CSE_ID, expire after SEARCH_CACHE_TTL seconds, and
+# only the SEARCH_CACHE_MAX_ENTRIES most recently used queries are kept.
+SEARCH_CACHE_FILE = os.path.join(OUT_PATH, "searchCache.sqlite")
+SEARCH_CACHE_TTL = 30 * 24 * 60 * 60 # seconds
+SEARCH_CACHE_MAX_ENTRIES = 1000000
+
 # Search Query Parameters
 TOP_K_WORDS = 5
+# Generate queries only for banners not seen by earlier runs, updating the word
+# document frequencies saved in QUERY_STATE_FILE instead of refitting on all banners
+INCREMENTAL_QUERIES = False
+# Number of dictionary word verdicts cached during query generation (None caches all)
+DICTIONARY_CACHE_SIZE = 1000000
+# How HTTP banner text is extracted once tags are stripped: "fast" drops comments and
+# declarations and unescapes HTML entities with regular expressions, "beautifulsoup" parses
+# it with BeautifulSoup's html.parser (slower); tests/htmlTextParity.py compares them
+HTML_TEXT_EXTRACTOR = "fast"
+# Number of worker processes cleaning banners (1 runs in the main process)
+CLEANING_WORKERS = os.cpu_count()
+# Number of banners dispatched to a worker at a time
+CLEANING_CHUNK_SIZE = 256
 
 # Web Crawler Parameters
 DOWNLOAD_TIMEOUT = 60 # seconds 
 DOWNLOAD_MAXSIZE = 1000000 # bytes 
 PDF_PAGES_TO_PROCESS = 5
 
+# Polling interval of the crawler for URLs found by search in streaming mode
+CRAWL_QUEUE_POLL_INTERVAL = 0.5 # seconds
+
+# Streaming pipeline: run get_links, get_pages and get_annotations concurrently
+# (only when running from the get_queries or get_links stage)
+STREAMING_PIPELINE = False
+# Maximum number of URLs waiting to be crawled and of pages being annotated
+STREAM_QUEUE_SIZE = 1000
+# Seconds to wait for get_links to stop once pages are done (e.g. after a crawler failure)
+STREAM_SHUTDOWN_TIMEOUT = 60
+
 # Annotation Finder Parameters
 # Some pages contain content with no natural line breaks (for example, a .css
 # file snippet), and the code ends up treating it as one big line with
@@ -57,7 +110,17 @@ PDF_PAGES_TO_PROCESS = 5
 # this    
 MAX_ANNOTATIONS_PER_LINE = 500
 
+# Number of worker processes annotating pages (1 runs in the main process)
+ANNOTATION_WORKERS = os.cpu_count()
+# Number of pages dispatched to a worker at a time
+ANNOTATION_CHUNK_SIZE = 16
+# Write annotations in urls.txt order (False writes them as workers finish)
+ANNOTATION_ORDERED = True
+
 # Apriori algorithm parameters
 MIN_SUPPORT = 0.001
 MIN_CONFIDENCE = 0.5
+# How rules are mined: "banner" counts the itemsets of every transaction in one pass and keeps
+# those with a banner; "itemsets" mines all frequent itemsets. Both produce the same rules
+RULE_ENGINE = "banner"
 
@@ -1,7 +1,12 @@
 from QueryGenerator import QueryGenerator
-from LinkFetcher import LinkFetcher
+from LinkFetcher import LinkFetcher, TokenBucket
 from NameFinder import NameFinder
+from ItemMatcher import ItemMatcher
 from RuleGenerator import RuleGenerator
+from SearchCache import SearchCache
+from PageStore import PageStore
+from BannerReader import BannerReader
+from WebCrawler.WebCrawler import crawl
 from staticLists.devices import devices
 from staticLists.vendors import vendors
 from utils import *
@@ -9,14 +14,18 @@ import json
 import logging
 import config
 import threading
-import time
 import concurrent.futures
+import multiprocessing
+import queue
 import os
 import signal
 import sys
 from datetime import datetime
 import random
 numOfBanners = config.NUM_PROCESS_BANNERS
+annotationMatcher = None
+annotationPageStore = None
+linkFetcher = LinkFetcher()
 stagesList = [
     "get_queries",
     "get_links",
@@ -79,15 +88,15 @@ def timeout(signum, frame):
     raise Exception('Timed out.')
 
 
-def getURLs(query, key, urlToQueryMap):
+def addURLs(query, results, urlToQueryMap):
     '''
-    This function returns Google search result URLs against a query.
+    This function records the Google search result URLs of a query.
     :param query: A list containing query keywords
+    :param results: A dictionary containing the search API response for the query
     :param urlToQueryMap: A dictionary that maps URLs to their queries
     :return: A list of URLs
     '''
     links = []
-    results = LinkFetcher().getUrlsGoogle(query, key)
     try:
         if "items" in results:
             for item in results["items"]:
@@ -124,6 +133,18 @@ def logQueries(queries):
     return log
 
 
+def getQueryIndex(allQueries):
+    '''
+    This function creates an inverted index of queries.
+    :param allQueries: A list of all queries
+    :return: A dictionary that maps queries to their (1-based) positions in allQueries
+    '''
+    queryToIndicesMap = {}
+    for i, query in enumerate(allQueries):
+        queryToIndicesMap.setdefault(query, []).append(i + 1)
+    return queryToIndicesMap
+
+
 def logLinks(urlToQueryMap, allQueries):
     '''
     This function generates "linksLog" intermediate logs.
@@ -135,13 +156,11 @@ def logLinks(urlToQueryMap, allQueries):
     for i, query in enumerate(allQueries):
         log[i + 1] = {"query": query, "links": []}
 
+    queryToIndicesMap = getQueryIndex(allQueries)
     linksLog = open(config.LINKS_LOG_FILE, "w")
     for url, queries in urlToQueryMap.items():
         for query in queries:
-            indices = [
-                i + 1 for i,
-                val in enumerate(allQueries) if val == query]
-            for index in indices:
+            for index in queryToIndicesMap.get(query, []):
                 log[index]["links"].append(url)
 
     linksLog.write(json.dumps(log, indent=4))
@@ -149,43 +168,40 @@ def logLinks(urlToQueryMap, allQueries):
     return log
 
 
-def logDER(logSoFar, bannerToAnnotationsMap, allBanners):
+def logDER(logSoFar, bannerToAnnotationsMap, bannerToIndexMap):
     '''
     This function generates "derLog" intermediate logs.
     :param logSoFar: A dictionary of "linksLog" intermediate logs from get_links stage
     :param bannerToAnnotationsMap: A dictionary that maps banners to their annotations
-    :param allBanners: A list of all banners
+    :param bannerToIndexMap: A dictionary that maps banner texts to their positions in the list of all banners
     :return: A dictionary of "derLog"(see README for format). "derLog.txt" is saved in config.OUT_PATH directory
     '''
     log = logSoFar
-    allBanners = [x["banner"] for x in allBanners]
     for banner, annotations in bannerToAnnotationsMap.items():
-        index = allBanners.index(banner)
+        index = bannerToIndexMap[banner]
         log[str(index + 1)]["annotations"] = annotations
     derLog = open(config.DER_LOG_FILE, "w")
     derLog.write(json.dumps(log, indent=4))
     return log
 
 
-def logRules(logSoFar, rules, allBanners):
+def logRules(logSoFar, rules, bannerToIndexMap):
     '''
     This function generates "rulesLog" intermediate logs.
     :param logSoFar: A dictionary of "derLog" intermediate logs from get_annotations stage
     :param rules: A list of all rules
-    :param allBanners: A list of all banners
+    :param bannerToIndexMap: A dictionary that maps banner texts to their positions in the list of all banners
     :return: None. "rulesLog.txt" is saved in config.OUT_PATH directory
     '''
     log = logSoFar
-    seenBanners = []
-    allBanners = [x["banner"] for x in allBanners]
+    seenBanners = set()
     for i, obj in log.items():
         log[i]["rules"] = []
 
     for rule in rules:
         banner = rule["banner"]
-        if banner not in seenBanners:
-            seenBanners.append(banner)
-        index = allBanners.index(banner)
+        seenBanners.add(banner)
+        index = bannerToIndexMap[banner]
         log[str(index + 1)]["rules"].append(rule)
 
     ruleLog = open(config.RULES_LOG_FILE, "w")
@@ -253,23 +269,34 @@ def getBanners(numBannersArg=None):
     '''
     This function reads banners from the banners file.
     :param numBannersArg: Number of banners to read
-    :return: A list of all banners
+    :return: A list of all banners, and a dictionary that maps banner texts to their positions in it
     '''
-    data = json.load(open(config.BANNERS_FILE)) 
-
     global numOfBanners
     if numBannersArg:
         numOfBanners = numBannersArg
 
-    allBanners = []
-    done = 0
-    for key, obj in data.items():
-        allBanners.append(obj)
-        done += 1
-        if done == int(numOfBanners):
-            break
+    limit = int(numOfBanners) if numOfBanners else None
+    bannerReader = BannerReader(
+        config.BANNERS_FILE,
+        limit,
+        config.BANNERS_OFFSET,
+        config.BANNERS_SHARD,
+        config.NUM_BANNERS_SHARDS)
+    allBanners = [obj for key, obj in bannerReader]
+
+    return allBanners, getBannerIndex(allBanners)
 
-    return allBanners
+
+def getBannerIndex(allBanners):
+    '''
+    This function builds an index of banner positions.
+    :param allBanners: A list of all banners
+    :return: A dictionary that maps banner texts to the position of their first occurrence in allBanners
+    '''
+    bannerToIndexMap = {}
+    for i, obj in enumerate(allBanners):
+        bannerToIndexMap.setdefault(obj["banner"], i)
+    return bannerToIndexMap
 
 
 def getQueriesFromLogs(allBanners):
@@ -300,6 +327,35 @@ def getQueriesFromLogs(allBanners):
     return allQueries, bannerToQueryMap, queryToBannerMap
 
 
+def getQueriesIncrementally(allBanners):
+    '''
+    This function extracts search queries from the banners not seen by earlier runs and reuses
+    the queries of the others, updating the query generator state in config.QUERY_STATE_FILE.
+    :param allBanners: a list of all banners
+    :return: List of all queries, dictionary that maps banners to their queries,
+             and dictionary that maps queries to their to banners
+    '''
+    QGen = QueryGenerator()
+    state = QGen.loadState(config.QUERY_STATE_FILE)
+    numSeenBanners = len(state["queries"])
+    bannerToQueryMap = QGen.generateIncrementally(allBanners, state)
+    QGen.saveState(state, config.QUERY_STATE_FILE)
+    print("New banners:", len(state["queries"]) - numSeenBanners)
+
+    queryToBannerMap = {}
+    for banner, query in bannerToQueryMap.items():
+        if query not in queryToBannerMap.keys():
+            queryToBannerMap[query] = [banner]
+        else:
+            queryToBannerMap[query].append(banner)
+
+    allQueries = [query for banner, query in bannerToQueryMap.items()]
+    t1 = datetime.now()
+    print("Got queries!", len(allQueries), t1)
+    logQueries(allQueries)
+    return allQueries, bannerToQueryMap, queryToBannerMap
+
+
 def getQueries(allBanners):
     '''
     This function extracts search queries from the banners.
@@ -307,6 +363,9 @@ def getQueries(allBanners):
     :return: List of all queries, dictionary that maps banners to their queries,
              and dictionary that maps queries to their to banners
     '''
+    if config.INCREMENTAL_QUERIES:
+        return getQueriesIncrementally(allBanners)
+
     if os.path.exists(config.QUERY_LOG_FILE):
         print("queryLog already exists.")
         getQueriesFromLogs(allBanners)
@@ -334,36 +393,118 @@ def getQueries(allBanners):
     return allQueries, bannerToQueryMap, queryToBannerMap
 
 
-def getLinks(allQueries):
+def putURL(urlQueue, url, crawlerStopped):
+    '''
+    This function puts a URL on the crawler's queue, waiting while the queue is full.
+    :param urlQueue: A queue of URLs to crawl
+    :param url: A string containing the URL, or None to end the queue
+    :param crawlerStopped: A threading.Event set once the crawler no longer reads the queue
+    :return: None. An exception is raised if the crawler stopped, since nothing would take the URL
+    '''
+    while not crawlerStopped.is_set():
+        try:
+            urlQueue.put(url, timeout=1)
+            return
+        except queue.Full:
+            continue
+    raise Exception("Crawler stopped before taking URL " + str(url))
+
+
+def queueURLs(results, urlQueue, queuedUrls, crawlerStopped):
+    '''
+    This function passes new Google search result URLs on to the crawler in streaming mode.
+    :param results: A dictionary containing the search API response for a query
+    :param urlQueue: A queue of URLs to crawl
+    :param queuedUrls: A set of URLs already put on the queue
+    :param crawlerStopped: A threading.Event set once the crawler no longer reads the queue
+    :return: None
+    '''
+    for item in results.get("items", []):
+        link = item.get("link")
+        if link is not None and link not in queuedUrls:
+            queuedUrls.add(link)
+            putURL(urlQueue, link, crawlerStopped)
+
+
+def getLinks(allQueries, urlQueue=None, crawlerStopped=None):
     '''
     This function obtains URLs for the search queries.
     :param allQueries: A list of all querries
-    :return: None. A list of all URLs is saved in "urls.txt" file in config.OUT_PATH folder
+    :param urlQueue: An optional queue receiving every new URL as soon as it is found (streaming mode)
+    :param crawlerStopped: A threading.Event set once the crawler no longer reads urlQueue (streaming mode)
+    :return: A list of all URLs. The list is also saved in "urls.txt" file in config.OUT_PATH folder
     '''
     urlToQueryMap = {}
     allUrls = []
     uniqueQueries = list(set(allQueries))
     print("Total unique queries", len(uniqueQueries))
 
+    searchCache = None
+    queryToResults = {}
+    if config.SEARCH_CACHE_FILE:
+        searchCache = SearchCache(
+            config.SEARCH_CACHE_FILE,
+            config.SEARCH_CACHE_TTL,
+            config.SEARCH_CACHE_MAX_ENTRIES)
+        for query in uniqueQueries:
+            results = searchCache.get(query, config.CSE_ID)
+            if results is not None:
+                queryToResults[query] = results
+        print("Cached queries", len(queryToResults))
+    queriesToFetch = [
+        query for query in uniqueQueries if query not in queryToResults]
+
     if config.UNLIMITED_QUOTA:
-        queryTasks = [uniqueQueries]
+        queryTasks = [queriesToFetch]
     else:
-        if (len(config.API_KEYS) * config.QUOTA_PER_KEY) < len(uniqueQueries):
+        if (len(config.API_KEYS) * config.QUOTA_PER_KEY) < len(queriesToFetch):
             raise Exception("Not enough key quota to get links for queries")
-        queryTasks = [uniqueQueries[x:x + config.QUOTA_PER_KEY]
-                      for x in range(0, len(uniqueQueries), config.QUOTA_PER_KEY)]
+        queryTasks = [queriesToFetch[x:x + config.QUOTA_PER_KEY]
+                      for x in range(0, len(queriesToFetch), config.QUOTA_PER_KEY)]
 
+    # every key gets its own threads and rate limit so that keys are fetched concurrently
+    batches = []
     for taskNum, task in enumerate(queryTasks):
         print("Getting links for task number", taskNum, "with", len(task),
               "queries")
-        added = 0
-        for query in task:
-            if added == config.SEARCH_API_BATCH_SIZE:
-                added = 0
-                time.sleep(config.SEARCH_API_WAIT_TIME)
-            urls = getURLs(query, config.API_KEYS[taskNum], urlToQueryMap)
-            added += 1
-            allUrls += urls
+        limiter = TokenBucket(
+            config.SEARCH_API_BATCH_SIZE / config.SEARCH_API_WAIT_TIME,
+            config.SEARCH_API_BATCH_SIZE)
+        batches.append(linkFetcher.getUrlsGoogleBatch(
+            task,
+            config.API_KEYS[taskNum],
+            limiter,
+            config.SEARCH_API_RETRIES,
+            config.SEARCH_API_THREADS_PER_KEY))
+
+    queuedUrls = set()
+    if urlQueue is not None:
+        for results in queryToResults.values():
+            queueURLs(results, urlQueue, queuedUrls, crawlerStopped)
+
+    try:
+        for batch in batches:
+            for query, results in batch:
+                queryToResults[query] = results
+                if urlQueue is not None:
+                    if crawlerStopped is not None and crawlerStopped.is_set():
+                        raise Exception("Crawler stopped before all queries were searched")
+                    queueURLs(results, urlQueue, queuedUrls, crawlerStopped)
+                # failed searches return {} and are not cached
+                if searchCache is not None and results:
+                    searchCache.put(query, config.CSE_ID, results)
+    finally:
+        # on failure, searches that have not started are cancelled instead of being sent
+        for batch in batches:
+            batch.close()
+
+    if searchCache is not None:
+        searchCache.evict()
+        searchCache.close()
+
+    # results are recorded in query order so that the logs do not depend on timing
+    for query in uniqueQueries:
+        allUrls += addURLs(query, queryToResults[query], urlToQueryMap)
 
     allUrls = list(set(allUrls))
 
@@ -374,41 +515,129 @@ def getLinks(allQueries):
     t2 = datetime.now()
     print("Got links!", len(allUrls), t2)
     log = logLinks(urlToQueryMap, allQueries)
+    return allUrls
+
+
+def crawlPages(urls, urlQueue=None, crawlerStarted=None):
+    '''
+    This function crawls webpages in a separate process and reports them as they arrive.
+    :param urls: An iterable of URLs
+    :param urlQueue: An optional multiprocessing queue of more URLs to crawl as they arrive, ended by None
+    :param crawlerStarted: An optional function called once the crawler process is started
+    :return: A generator of (url, status, content hash) tuples. Status is "crawled", "cached" (already
+             in the page store) or "failed: <reason>"; page texts are read from the page store by content hash.
+             An exception is raised if the crawler process dies before finishing
+    '''
+    resultQueue = multiprocessing.Queue()
+    crawler = multiprocessing.Process(
+        target=crawl, args=(list(urls), resultQueue, urlQueue))
+    crawler.start()
+    if crawlerStarted is not None:
+        crawlerStarted()
+
+    while True:
+        try:
+            result = resultQueue.get(timeout=1)
+        except queue.Empty:
+            if not crawler.is_alive():
+                raise Exception(
+                    "Crawler exited with code " + str(crawler.exitcode) + " before finishing")
+            continue
+        if result is None:
+            break
+        yield result
+
+    crawler.join()
 
 
-def getPages():
+def getPages(urls=None):
     '''
-    This function reads URLs and crawls webpages.
-    :return: None. Crawled pages are saved in config.OUT_PATH folder
+    This function crawls webpages.
+    :param urls: A list of URLs from the get_links stage (read from "urls.txt" if not given)
+    :return: A dictionary that maps URLs to their crawl status. Crawled pages are saved in config.PAGES_PATH folder
     '''
     if not os.path.exists(config.PAGES_PATH):
         os.makedirs(config.PAGES_PATH)
-    cmd = "scrapy crawl WebCrawler -s LOG_ENABLED=False --logfile " + config.ARE_DEBUG_LOG + " -a urlsFileName=" + \
-        config.URLS_FILE + " -a outPath=" + config.PAGES_PATH
-    logging.info(cmd)
-    os.system(cmd)
+    if urls is None:
+        with open(config.URLS_FILE) as urlsFile:
+            urls = [line.rstrip() for line in urlsFile]
+
+    urlToStatusMap = {}
+    statusCounts = {}
+    for url, status, blob in crawlPages(urls):
+        logging.info("Page " + url + ": " + status)
+        urlToStatusMap[url] = status
+        status = status.split(":")[0]
+        statusCounts[status] = statusCounts.get(status, 0) + 1
+
     t3 = datetime.now()
-    print("Got pages!", t3)
+    print("Got pages!", statusCounts, t3)
+    return urlToStatusMap
 
 
-def getAnnotations(
-        allBanners,
-        allQueries,
-        bannerToQueryMap,
-        queryToBannerMap):
+def initAnnotationWorker():
     '''
-    This function generates annotations.
-    :param allBanners: a list of all banners
-    :param allQueries: a list of all queries
-    :param bannerToQueryMap: a dictionary that maps banners to their queries
-    :param queryToBannerMap: a dictionary that maps queries to their banners
-    :return: Dictionary that maps banners to their annotations, and dictionary of "DERlogs" intermediate logs
+    This function prepares a process for annotating pages.
+    :return: None. The device/vendor ItemMatcher and the page store are opened once per process
     '''
-    urls = []
-    urlsFile = open(config.URLS_FILE)
-    for line in urlsFile:
-        urls.append(line.strip("\n").strip(" "))
+    global annotationMatcher
+    global annotationPageStore
+    annotationMatcher = ItemMatcher(devices, vendors)
+    annotationPageStore = PageStore(config.PAGES_PATH)
+
 
+def annotatePage(task):
+    '''
+    This function extracts annotations from a crawled page.
+    :param task: A tuple containing the content hash of the page and the list of URLs serving it
+    :return: A tuple containing the URLs, the sorted annotations and the device/vendor/product found flags,
+             or None if the page could not be processed
+    '''
+    blob, urls = task
+    try:
+        page = annotationPageStore.read(blob)
+        annotations, dF, vF, pF, dVF, dVPF = NameFinder(
+            page).extractInfo(devices, vendors, annotationMatcher)
+        annotations = sorted(annotations, key=lambda x: (x[2] is None, x))
+        return urls, annotations, dF, vF, pF, dVF, dVPF
+
+    except Exception as e:
+        logging.exception(
+            "Exception occured during getAnnotations stage while processing page " +
+            blob +
+            ": " +
+            str(e))
+        return None
+
+
+def annotatePages(tasks):
+    '''
+    This function annotates crawled pages, in a pool of worker processes if configured.
+    :param tasks: A list of tuples containing page content hashes and their URLs
+    :return: A generator of annotatePage results, in task order if config.ANNOTATION_ORDERED is set
+    '''
+    if config.ANNOTATION_WORKERS == 1:
+        initAnnotationWorker()
+        for task in tasks:
+            yield annotatePage(task)
+        return
+
+    with multiprocessing.Pool(config.ANNOTATION_WORKERS, initializer=initAnnotationWorker) as pool:
+        if config.ANNOTATION_ORDERED:
+            results = pool.imap(
+                annotatePage, tasks, config.ANNOTATION_CHUNK_SIZE)
+        else:
+            results = pool.imap_unordered(
+                annotatePage, tasks, config.ANNOTATION_CHUNK_SIZE)
+        for result in results:
+            yield result
+
+
+def getUrlToQueryMap():
+    '''
+    This function reads the queries of every URL from "linksLog".
+    :return: A dictionary that maps URLs to their queries
+    '''
     urlToQueryMap = {}
     linksLog = json.load(open(config.LINKS_LOG_FILE))
 
@@ -427,57 +656,101 @@ def getAnnotations(
         if done == int(numOfBanners):
             break
 
-    urlToAnnotationsFile = open(config.INTERMEDIATE_FILE, "w")
-    urlToAnnotationsFile.write("")
-    urlToAnnotationsFile.close()
-    urlToAnnotationsFile = open(config.INTERMEDIATE_FILE, "a")
+    return urlToQueryMap
+
+
+def writeAnnotations(urlToAnnotationsFile, urls, result):
+    '''
+    This function writes the annotations of a page for every URL serving it.
+    :param urlToAnnotationsFile: A file object of the annotations intermediate file
+    :param urls: A list of URLs serving the page
+    :param result: A tuple returned by annotatePage
+    :return: None
+    '''
+    _, annotations, dF, vF, pF, dVF, dVPF = result
+    for url in urls:
+        writeAnnotationsRecord(
+            urlToAnnotationsFile,
+            url,
+            annotations,
+            dF,
+            vF,
+            pF,
+            dVF,
+            dVPF)
+
+
+def getAnnotations(
+        bannerToIndexMap,
+        allQueries,
+        bannerToQueryMap,
+        queryToBannerMap):
+    '''
+    This function generates annotations.
+    :param bannerToIndexMap: a dictionary that maps banner texts to their positions in the list of all banners
+    :param allQueries: a list of all queries
+    :param bannerToQueryMap: a dictionary that maps banners to their queries
+    :param queryToBannerMap: a dictionary that maps queries to their banners
+    :return: Dictionary that maps banners to their annotations, and dictionary of "DERlogs" intermediate logs
+    '''
+    urls = []
+    urlsFile = open(config.URLS_FILE)
+    for line in urlsFile:
+        urls.append(line.strip("\n").strip(" "))
+
+    urlToQueryMap = getUrlToQueryMap()
 
-    for i, url in enumerate(urls):
-        if url not in urlToQueryMap.keys():
+    # pages with identical contents (mirrors, redirects) are annotated once
+    pageStore = PageStore(config.PAGES_PATH)
+    blobToUrlsMap = {}
+    for url in urls:
+        if url not in urlToQueryMap:
             continue
-        try:
-            page = open(config.PAGES_PATH + str(i), "rb").read()
-            page = page.decode('utf-8')
-            url = urls[i]
-            annotations, dF, vF, pF, dVF, dVPF = NameFinder(
-                page).extractInfo(devices, vendors)
-            annotations = sorted(annotations, key=lambda x: (x[2] is None, x))
-            urlToAnnotationsFile.write(
-                url.strip("\n").strip(" ") +
-                " ::: " +
-                str(annotations) +
-                " ::: " +
-                str(dF) +
-                " ::: " +
-                str(vF) +
-                " ::: " +
-                str(pF) +
-                " ::: " +
-                str(dVF) +
-                " ::: " +
-                str(dVPF) +
-                "\n")
-
-        except Exception as e:
-            logging.exception(
-                "Exception occured during getAnnotations stage while processing page" +
-                str(i) +
-                ": " +
-                str(e))
-
-    urlToAnnotationsFile.close()
-    urlToAnnotationsFile = open(config.INTERMEDIATE_FILE)
+        blob = pageStore.getBlob(url)
+        if blob is None:
+            logging.info("No page was crawled for " + url)
+            continue
+        blobToUrlsMap.setdefault(blob, []).append(url)
+    tasks = list(blobToUrlsMap.items())
+
+    with open(config.INTERMEDIATE_FILE, "w") as urlToAnnotationsFile:
+        for result in annotatePages(tasks):
+            if result is None:
+                continue
+            writeAnnotations(urlToAnnotationsFile, result[0], result)
+
+    t4 = datetime.now()
+    print("Got annotations!", t4)
+    return mergeAnnotations(
+        bannerToIndexMap, bannerToQueryMap, queryToBannerMap, urlToQueryMap)
+
+
+def mergeAnnotations(
+        bannerToIndexMap,
+        bannerToQueryMap,
+        queryToBannerMap,
+        urlToQueryMap):
+    '''
+    This function merges the annotations of all URLs into annotations of their banners.
+    :param bannerToIndexMap: a dictionary that maps banner texts to their positions in the list of all banners
+    :param bannerToQueryMap: a dictionary that maps banners to their queries
+    :param queryToBannerMap: a dictionary that maps queries to their banners
+    :param urlToQueryMap: a dictionary that maps URLs to their queries
+    :return: Dictionary that maps banners to their annotations, and dictionary of "DERlogs" intermediate logs
+    '''
     bannerToAnnotationsMap = {}
     bannerToStatsMap = {}
 
-    for line in urlToAnnotationsFile:
-        url = line.split(" ::: ")[0]
-        annotations = eval(line.split(" ::: ")[1])
-        anyDeviceType = eval(line.split(" ::: ")[2])
-        anyVendor = eval(line.split(" ::: ")[3])
-        anyProduct = eval(line.split(" ::: ")[4])
-        anyDeviceTypeAndVendor = eval(line.split(" ::: ")[5])
-        anyDeviceTypeProdAndVendor = eval(line.split(" ::: ")[6])
+    for record in readAnnotationsRecords(config.INTERMEDIATE_FILE):
+        url = record["url"]
+        annotations = record["annotations"]
+        anyDeviceType = record["deviceTypeFound"]
+        anyVendor = record["vendorFound"]
+        anyProduct = record["productFound"]
+        anyDeviceTypeAndVendor = record["deviceTypeAndVendorFound"]
+        anyDeviceTypeProdAndVendor = record["deviceTypeVendorAndProductFound"]
+        if url not in urlToQueryMap:
+            continue
         queries = urlToQueryMap[url]
 
         for query in queries:
@@ -510,18 +783,160 @@ def getAnnotations(
                         oldStats[3] or anyDeviceTypeAndVendor,
                         oldStats[4] or anyDeviceTypeProdAndVendor]
 
-    t4 = datetime.now()
-    print("Got annotations!", t4)
     linksLog = json.load(open(config.LINKS_LOG_FILE))
-    log = logDER(linksLog, bannerToAnnotationsMap, allBanners)
+    log = logDER(linksLog, bannerToAnnotationsMap, bannerToIndexMap)
     logStats(bannerToStatsMap, bannerToQueryMap)
     return bannerToAnnotationsMap, log
 
 
-def getRules(allBanners, bannerToAnnotationsMap, log):
+def feedLinks(allQueries, urlQueue, crawlerStopped, errors):
+    '''
+    This function runs the get_links stage for the streaming pipeline.
+    :param allQueries: A list of all queries
+    :param urlQueue: A queue receiving every new URL, and None once all queries are searched
+    :param crawlerStopped: A threading.Event set once the crawler no longer reads urlQueue
+    :param errors: A list receiving the exception that stopped the stage, if any
+    :return: None
+    '''
+    try:
+        getLinks(allQueries, urlQueue, crawlerStopped)
+    except Exception as e:
+        logging.exception(
+            "Exception occurred during get_links stage: " + str(e))
+        errors.append(e)
+
+    try:
+        putURL(urlQueue, None, crawlerStopped)
+    except Exception as e:
+        logging.exception(
+            "Could not end the crawler's URL queue: " + str(e))
+
+
+def collectAnnotations(
+        pending,
+        maxPending,
+        blobToUrlsMap,
+        blobToResultMap,
+        urlToAnnotationsFile):
+    '''
+    This function writes the annotations of pages whose annotation has finished.
+    :param pending: A list of (content hash, AsyncResult) tuples in submission order
+    :param maxPending: An int; the oldest pages are waited for until at most this many are left in progress
+    :param blobToUrlsMap: A dictionary that maps content hashes to the URLs waiting for their annotations
+    :param blobToResultMap: A dictionary that maps content hashes to their annotatePage results
+    :param urlToAnnotationsFile: A file object of the annotations intermediate file
+    :return: A list of the (content hash, AsyncResult) tuples still in progress
+    '''
+    stillPending = []
+    for i, (blob, annotation) in enumerate(pending):
+        inProgress = len(stillPending) + len(pending) - i
+        if not annotation.ready() and inProgress <= maxPending:
+            stillPending.append((blob, annotation))
+            continue
+        result = annotation.get()
+        blobToResultMap[blob] = result
+        urls = blobToUrlsMap.pop(blob)
+        if result is not None:
+            writeAnnotations(urlToAnnotationsFile, urls, result)
+    return stillPending
+
+
+def getLinksPagesAndAnnotations(
+        bannerToIndexMap,
+        allQueries,
+        bannerToQueryMap,
+        queryToBannerMap):
+    '''
+    This function runs the get_links, get_pages and get_annotations stages concurrently: URLs are
+    crawled as soon as search returns them and pages are annotated as soon as they are crawled.
+    Bounded queues (config.STREAM_QUEUE_SIZE) keep a fast stage from running far ahead of a slow one.
+    :param bannerToIndexMap: a dictionary that maps banner texts to their positions in the list of all banners
+    :param allQueries: a list of all queries
+    :param bannerToQueryMap: a dictionary that maps banners to their queries
+    :param queryToBannerMap: a dictionary that maps queries to their banners
+    :return: Dictionary that maps banners to their annotations, and dictionary of "DERlogs" intermediate logs
+    '''
+    if not os.path.exists(config.PAGES_PATH):
+        os.makedirs(config.PAGES_PATH)
+
+    urlQueue = multiprocessing.Queue(config.STREAM_QUEUE_SIZE)
+    crawlerStopped = threading.Event()
+    linksErrors = []
+    # a daemon thread, so that a search stuck after a crawler failure cannot keep the process alive.
+    # It is started once the annotation pool and the crawler process are forked, since forking
+    # while its search threads run could copy locks they hold into the children
+    linksThread = threading.Thread(
+        target=feedLinks,
+        args=(allQueries, urlQueue, crawlerStopped, linksErrors),
+        daemon=True)
+
+    try:
+        getPagesAndAnnotations(urlQueue, linksThread.start)
+    finally:
+        # the links thread stops queueing URLs (and cancels searches) once nothing reads them
+        crawlerStopped.set()
+        urlQueue.cancel_join_thread()
+        if linksThread.ident is not None:
+            linksThread.join(config.STREAM_SHUTDOWN_TIMEOUT)
+
+    if linksThread.is_alive():
+        raise Exception("get_links stage did not stop within " +
+                        str(config.STREAM_SHUTDOWN_TIMEOUT) + " seconds")
+    if linksErrors:
+        raise linksErrors[0]
+
+    t4 = datetime.now()
+    print("Got pages and annotations!", t4)
+    return mergeAnnotations(
+        bannerToIndexMap, bannerToQueryMap, queryToBannerMap, getUrlToQueryMap())
+
+
+def getPagesAndAnnotations(urlQueue, crawlerStarted):
+    '''
+    This function runs the get_pages and get_annotations stages for the streaming pipeline.
+    :param urlQueue: A queue of URLs to crawl, ended by None
+    :param crawlerStarted: A function called once the annotation pool and the crawler process are started
+    :return: None. Annotations are written to the config.INTERMEDIATE_FILE file
+    '''
+    blobToUrlsMap = {}
+    blobToResultMap = {}
+    pending = []
+    with open(config.INTERMEDIATE_FILE, "w") as urlToAnnotationsFile, \
+            multiprocessing.Pool(config.ANNOTATION_WORKERS, initializer=initAnnotationWorker) as pool:
+        for url, status, blob in crawlPages([], urlQueue, crawlerStarted):
+            logging.info("Page " + url + ": " + status)
+            if blob is None:
+                continue
+            # pages with identical contents (mirrors, redirects) are annotated once
+            if blob in blobToResultMap:
+                if blobToResultMap[blob] is not None:
+                    writeAnnotations(
+                        urlToAnnotationsFile, [url], blobToResultMap[blob])
+            elif blob in blobToUrlsMap:
+                blobToUrlsMap[blob].append(url)
+            else:
+                blobToUrlsMap[blob] = [url]
+                pending.append(
+                    (blob, pool.apply_async(annotatePage, ((blob, []),))))
+            pending = collectAnnotations(
+                pending,
+                config.STREAM_QUEUE_SIZE,
+                blobToUrlsMap,
+                blobToResultMap,
+                urlToAnnotationsFile)
+
+        collectAnnotations(
+            pending,
+            0,
+            blobToUrlsMap,
+            blobToResultMap,
+            urlToAnnotationsFile)
+
+
+def getRules(bannerToIndexMap, bannerToAnnotationsMap, log):
     '''
     This function generates rules from transactions.
-    :param allBanners: A list of all banners
+    :param bannerToIndexMap: A dictionary that maps banner texts to their positions in the list of all banners
     :param bannerToAnnotationsMap: A dictionary that maps banners to their annotations
     :param log: A dictionary of "derLog" intermediate logs generated by get_annotations stage
     :return: None. "rules.csv" file is saved in config.OUT_PATH folder
@@ -530,7 +945,7 @@ def getRules(allBanners, bannerToAnnotationsMap, log):
     rules = RuleGenerator(transactions).generate()
     t5 = datetime.now()
     print("Got rules!", t5)
-    logRules(log, rules, allBanners)
+    logRules(log, rules, bannerToIndexMap)
 
 
 if __name__ == "__main__":
@@ -544,15 +959,22 @@ if __name__ == "__main__":
     logging.info('Started')
     parseArguments(sys.argv[1:])
     print("Num of Banners=", numOfBanners)
-    allBanners = getBanners()
+    allBanners, bannerToIndexMap = getBanners()
     allQueries, bannerToQueryMap, queryToBannerMap = getQueries(allBanners)
 
-    if "get_links" in stagesList:
-        getLinks(allQueries)
-    if "get_pages" in stagesList:
-        getPages()
-    if "get_annotations" in stagesList:
-        bannerToAnnotationsMap, log = getAnnotations(
-            allBanners, allQueries, bannerToQueryMap, queryToBannerMap)
-
-    getRules(allBanners, bannerToAnnotationsMap, log)
+    streamingStages = ["get_links", "get_pages", "get_annotations"]
+    if config.STREAMING_PIPELINE and all(
+            stage in stagesList for stage in streamingStages):
+        bannerToAnnotationsMap, log = getLinksPagesAndAnnotations(
+            bannerToIndexMap, allQueries, bannerToQueryMap, queryToBannerMap)
+    else:
+        allUrls = None
+        if "get_links" in stagesList:
+            allUrls = getLinks(allQueries)
+        if "get_pages" in stagesList:
+            getPages(allUrls)
+        if "get_annotations" in stagesList:
+            bannerToAnnotationsMap, log = getAnnotations(
+                bannerToIndexMap, allQueries, bannerToQueryMap, queryToBannerMap)
+
+    getRules(bannerToIndexMap, bannerToAnnotationsMap, log)
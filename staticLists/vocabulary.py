@@ -0,0 +1,7 @@
+# encoding: utf-8
+from staticLists.devices import devices
+from staticLists.vendors import vendors
+
+# words of device types and vendor names, which are never discarded as dictionary words
+vocabulary = frozenset(
+    word for item in devices + vendors for word in item.split(" "))
@@ -0,0 +1,78 @@
+""" Check that the fast HTML text extractor gives the text BeautifulSoup gives
+
+Run from anywhere: python tests/htmlTextParity.py [banners file]
+Exits with status 1 if the two extractors disagree on any banner.
+"""
+
+import os
+import sys
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_DIR)
+
+import config
+from BannerReader import BannerReader
+from QueryGenerator import QueryGenerator
+
+# HTTP banners with markup that is not in the bundled banners
+SYNTHETIC_BANNERS = [
+    '<html><!-- <a href="/old.htm">legacy dvr login</a> --><title>netcam ip-7000</title></html>',
+    '<!-- multi\nline <b>comment</b> --><p>router &amp; modem</p><!---->',
+    '<!-- a -- b --><p>after</p>',
+    '<script><![CDATA[var model = "dcs-930l";]]></script><p>d-link &lt;camera&gt;</p>',
+    '<p>cdata keeps <![CDATA[<b>tags</b> &amp; entities]]> as is</p>',
+    '<![CDATA[]]><p>empty cdata</p>',
+    '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN"><html><body>printer</body></html>',
+    '<?xml version="1.0" encoding="utf-8"?><root>nas &#8211; storage</root>',
+    '<p>tom&jerry &amp co &nbsp; &#65;&#x42;</p>',
+    '<html>\n\n<!-- c -->\n\n<body> \t </body>\n</html>',
+]
+
+
+def getHTTPBanners(bannersFileName):
+    '''
+    This function reads the HTTP banners to check.
+    :param bannersFileName: A string containing the path of a banners file
+    :return: A list of (banner ID, banner text) tuples
+    '''
+    banners = [(bannerId, banner["banner"])
+               for bannerId, banner in BannerReader(bannersFileName)
+               if banner["type"] == "HTTP"]
+    banners.extend(("synthetic-" + str(i), text)
+                   for i, text in enumerate(SYNTHETIC_BANNERS))
+    return banners
+
+
+def extractText(generator, text, extractor):
+    '''
+    This function refines HTTP banner text the way cleanBanner does, with the given extractor.
+    :param generator: A QueryGenerator
+    :param text: A string of banner text
+    :param extractor: A string containing the value of config.HTML_TEXT_EXTRACTOR to use
+    :return: A string of refined banner text
+    '''
+    config.HTML_TEXT_EXTRACTOR = extractor
+    return generator.refineHTTP(generator.removeEscapeChars(text.lower()))
+
+
+def main():
+    bannersFileName = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        REPO_DIR, "data", "ferret_banners.json")
+    generator = QueryGenerator()
+
+    mismatches = 0
+    banners = getHTTPBanners(bannersFileName)
+    for bannerId, text in banners:
+        expected = extractText(generator, text, "beautifulsoup")
+        actual = extractText(generator, text, "fast")
+        if actual != expected:
+            mismatches += 1
+            print("Banner " + str(bannerId) + ":\n  beautifulsoup: " + repr(expected)
+                  + "\n  fast:          " + repr(actual))
+
+    print(str(len(banners) - mismatches) + " of " + str(len(banners)) + " HTTP banners match")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
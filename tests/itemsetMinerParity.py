@@ -0,0 +1,102 @@
+""" Check that ItemsetMiner finds the records apyori finds, and time both
+
+Run from anywhere: python tests/itemsetMinerParity.py [number of benchmark transactions]
+Skips if apyori is not installed; exits with status 1 if the records differ.
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ItemsetMiner import ItemsetMiner
+
+# (number of transactions, minimum support, minimum confidence) of the parity checks
+PARITY_CASES = [(0, 0.1, 0.5), (200, 0.01, 0.5), (500, 0.05, 0.0), (2000, 0.002, 0.3),
+                (5000, 0.001, 0.5)]
+BENCHMARK_SUPPORT = 0.001
+BENCHMARK_CONFIDENCE = 0.5
+
+
+def makeTransactions(numTransactions, numBanners, numDevices, numVendors, numProducts, seed):
+    '''
+    This function makes transactions shaped like the ones makeAllTransactions makes: a banner,
+    a device type and often a vendor and a product, mostly the ones that go with the banner.
+    :param numTransactions: Number of transactions to make
+    :param numBanners: Number of distinct banners
+    :param numDevices: Number of distinct device types
+    :param numVendors: Number of distinct vendors
+    :param numProducts: Number of distinct products
+    :param seed: Seed of the random transactions
+    :return: A list of lists of items
+    '''
+    rand = random.Random(seed)
+    transactions = []
+    for _ in range(numTransactions):
+        banner = int(rand.paretovariate(1.2) * 3) % numBanners
+        transaction = ["banner" + str(banner), "device" + str(int(rand.paretovariate(1.5)) % numDevices)]
+        if rand.random() < 0.8:
+            vendor = banner % numVendors if rand.random() < 0.7 else rand.randrange(numVendors)
+            transaction.append("vendor" + str(vendor))
+        if rand.random() < 0.5:
+            product = banner % numProducts if rand.random() < 0.6 else rand.randrange(numProducts)
+            transaction.append("product" + str(product))
+        if rand.random() < 0.05:
+            # repeated items are counted once
+            transaction.append(transaction[0])
+        transactions.append(transaction)
+    return transactions
+
+
+def normalize(records):
+    '''
+    This function turns records into lists of sorted tuples, so that they can be compared.
+    :param records: An iterable of RelationRecord tuples (of apyori or ItemsetMiner)
+    :return: A list of tuples
+    '''
+    return [(tuple(sorted(record.items)), record.support,
+             [(tuple(sorted(statistic.items_base)), tuple(sorted(statistic.items_add)),
+               statistic.confidence, statistic.lift)
+              for statistic in record.ordered_statistics])
+            for record in records]
+
+
+def main():
+    try:
+        from apyori import apriori
+    except ImportError:
+        print("apyori is not installed, skipping")
+        return
+
+    numBenchmarkTransactions = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    failed = False
+    for seed, (numTransactions, minSupport, minConfidence) in enumerate(PARITY_CASES):
+        transactions = makeTransactions(numTransactions, 300, 20, 60, 80, seed)
+        expected = normalize(apriori(transactions, min_support=minSupport,
+                                     min_confidence=minConfidence))
+        actual = normalize(ItemsetMiner(transactions).mine(minSupport, minConfidence))
+        print(str(numTransactions) + " transactions: " + str(len(expected)) + " records, "
+              + ("same" if actual == expected else "DIFFERENT"))
+        failed = failed or actual != expected
+
+    transactions = makeTransactions(numBenchmarkTransactions, 3000, 40, 600, 900, len(PARITY_CASES))
+    start = time.time()
+    expected = normalize(apriori(transactions, min_support=BENCHMARK_SUPPORT,
+                                 min_confidence=BENCHMARK_CONFIDENCE))
+    apyoriTime = time.time() - start
+    start = time.time()
+    actual = normalize(ItemsetMiner(transactions).mine(BENCHMARK_SUPPORT, BENCHMARK_CONFIDENCE))
+    minerTime = time.time() - start
+    print(str(numBenchmarkTransactions) + " transactions: " + str(len(expected)) + " records, "
+          + ("same" if actual == expected else "DIFFERENT") + ", apyori "
+          + str(round(apyoriTime, 2)) + "s, ItemsetMiner " + str(round(minerTime, 2)) + "s")
+    failed = failed or actual != expected
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+""" Time the banner refiners with compiled patterns against passing pattern strings to re
+
+Run from anywhere: python tests/refinerBenchmark.py [number of passes] [banners file]
+Every refiner runs on every banner, since the bundled banners are nearly all UPnP.
+Exits with status 1 if the two versions refine any banner differently.
+"""
+
+import os
+import re
+import sys
+import time
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_DIR)
+
+from BannerReader import BannerReader
+from QueryGenerator import QueryGenerator, HTTP_ERROR_CODES, HEAVY_WEBSERVERS
+
+
+class StringPatternQueryGenerator(QueryGenerator):
+    ''' The refiners as they were before the patterns were compiled once at module level '''
+
+    def refineHTTP(self, text):
+        HTTPNonErrorCodes = [
+            "http/",
+            "100 Continue",
+            "101 Switching Protocols",
+            "200 OK",
+            "201 Created",
+            "202 Accepted",
+            "203 Non-authoritative information",
+            "204 no content",
+            "205 reset content",
+            "206 partial content",
+            "300 multiple choices",
+            "301 moved permanently",
+            "302 found",
+            "303 see other",
+            "304 not modified",
+            "305 use proxy",
+            "306 (unused)",
+            "307 temporary redirect"]
+        HTTPErrorCodes = list(HTTP_ERROR_CODES)
+        heavyWebservers = list(HEAVY_WEBSERVERS)
+
+        if any([errorCode in text for errorCode in HTTPErrorCodes]):
+            return ""
+
+        if any([webserver in text for webserver in heavyWebservers]):
+            return ""
+
+        for code in HTTPNonErrorCodes:
+            text.replace(code.lower(), "")
+
+        patScript = r"(?is)<script[^>]*>(.*?)</script>"
+        text = re.sub(patScript, "", text)
+
+        patStyle = r"(?is)<style[^>]*>(.*?)</style>"
+        text = re.sub(patStyle, "", text)
+
+        patLinks = r'^https?:\/\/.*[\r\n]*'
+        text = re.sub(patLinks, "", text)
+
+        patLinks = r'^http?:\/\/.*[\r\n]*'
+        text = re.sub(patLinks, "", text)
+
+        reg = re.compile('<[^<]+?>')
+        text = re.sub(reg, '', text)
+
+        dateTime = r'\d+[\/:\-]\d+[\/:\-\s]*[\dAaPpMn]*'
+        text = re.sub(dateTime, '', text)
+
+        # the HTML text is extracted as in QueryGenerator, so that only the patterns differ
+        return self.extractHTMLText(text)
+
+    def refineUPNP(self, text):
+        UUIDRemovedBanner = re.sub(
+            r'\b[0-9a-z]{8}\b-[0-9a-z]{4}-[0-9a-z]{4}-[0-9a-z]{4}-\b[0-9a-z]{12}\b',
+            "",
+            text)
+
+        splitted = UUIDRemovedBanner.split("\r")
+        dateRemovedBanner = []
+        for word in splitted:
+            loweredWord = word.lower()
+            if "date:" not in loweredWord and "location:" not in loweredWord:
+                dateRemovedBanner.append(word)
+
+        refinedText = ""
+        for ele in dateRemovedBanner:
+            refinedText = refinedText + "\r\n" + ele
+
+        return refinedText
+
+    def refineTELNET(self, text):
+        text = re.sub(r"[^\x00-\x7F]+", " ", text)
+        text = text.rstrip('\0')
+        return text
+
+
+def timeRefiner(generator, refinerName, texts, numPasses):
+    '''
+    This function times a refiner over banner texts.
+    :param generator: A QueryGenerator
+    :param refinerName: A string containing the name of the refiner method
+    :param texts: A list of strings of banner text, prepared as cleanBanner prepares them
+    :param numPasses: Number of times the texts are refined
+    :return: A tuple containing the seconds taken and a list of the refined texts of one pass
+    '''
+    refine = getattr(generator, refinerName)
+    start = time.perf_counter()
+    for _ in range(numPasses):
+        refinedTexts = [refine(text) for text in texts]
+    return time.perf_counter() - start, refinedTexts
+
+
+def main():
+    numPasses = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    bannersFileName = sys.argv[2] if len(sys.argv) > 2 else os.path.join(
+        REPO_DIR, "data", "ferret_banners.json")
+
+    compiledGenerator = QueryGenerator()
+    stringGenerator = StringPatternQueryGenerator()
+    texts = [compiledGenerator.removeEscapeChars(banner["banner"].lower())
+             for bannerId, banner in BannerReader(bannersFileName)]
+
+    failed = False
+    for refinerName in ("refineHTTP", "refineUPNP", "refineTELNET"):
+        stringTime, expected = timeRefiner(stringGenerator, refinerName, texts, numPasses)
+        compiledTime, actual = timeRefiner(compiledGenerator, refinerName, texts, numPasses)
+        numRefined = len(texts) * numPasses
+        print(refinerName + ", " + str(len(texts)) + " banners x " + str(numPasses)
+              + " passes, per banner: strings "
+              + str(round(1e6 * stringTime / numRefined, 1)) + "us, compiled "
+              + str(round(1e6 * compiledTime / numRefined, 1)) + "us, "
+              + ("same" if actual == expected else "DIFFERENT"))
+        failed = failed or actual != expected
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
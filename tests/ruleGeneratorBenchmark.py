@@ -0,0 +1,169 @@
+""" Time the labeling and dedup of rules in RuleGenerator.generate against the list-based loop
+
+Run from anywhere: python tests/ruleGeneratorBenchmark.py [number of banners] [number of compared banners]
+The list-based loop is quadratic in the number of rules, so it is only timed (and compared with
+generate) on the records of the first banners; generate alone is also timed on all records.
+Exits with status 1 if the two disagree on any rule.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import config
+from InternedTransactions import InternedTransactions
+from ItemsetMiner import RelationRecord, OrderedStatistic
+from RuleGenerator import RuleGenerator
+from staticLists.devices import devices
+from staticLists.vendors import vendors
+
+# item kinds of the synthetic itemsets of every banner; about 1.1 records (and 1 rule) per kind
+ITEMSET_KINDS = [("device",), ("vendor",), ("device", "vendor"), ("vendor", "product"),
+                 ("device", "vendor", "product")]
+
+
+def makeRecords(numBanners, seed):
+    '''
+    This function makes the transactions and mined records of synthetic banners. Every banner gets
+    an itemset of each of ITEMSET_KINDS, and some records repeat a rule or have no banner.
+    :param numBanners: Number of banners
+    :param seed: Seed of the random items
+    :return: A tuple containing the InternedTransactions and a list of RelationRecord tuples of item ids
+    '''
+    rand = random.Random(seed)
+    # banners are the first items of transactions, so every banner has one with its other items
+    bannerTransactions = []
+    itemsets = []
+    for banner in range(numBanners):
+        kindToItem = {"banner": "banner " + str(banner),
+                      "device": rand.choice(devices),
+                      "vendor": rand.choice(vendors),
+                      "product": "product" + str(rand.randrange(10 * numBanners))}
+        bannerTransactions.append([kindToItem[kind]
+                                   for kind in ("banner", "device", "vendor", "product")])
+        for kinds in ITEMSET_KINDS:
+            itemsets.append([kindToItem["banner"]] + [kindToItem[kind] for kind in kinds])
+            if rand.random() < 0.05:
+                # the same rule again, from another itemset
+                itemsets.append(itemsets[-1])
+            if rand.random() < 0.05:
+                itemsets.append([kindToItem[kind] for kind in kinds])
+
+    transactions = InternedTransactions(bannerTransactions)
+    itemIds = {item: itemId for itemId, item in enumerate(transactions.items)}
+
+    records = []
+    for itemset in itemsets:
+        statistics = [OrderedStatistic(frozenset(), frozenset(), rand.random(), 1.0)
+                      for _ in range(rand.randint(1, 3))]
+        records.append(RelationRecord(
+            frozenset(itemIds[item] for item in itemset), rand.random(), statistics))
+    return transactions, records
+
+
+def getListLabeledRule(items, banners):
+    '''
+    This function labels the items of a rule the way RuleGenerator did with lists.
+    :param items: A set of items
+    :param banners: A list of all banners
+    :return: A dictionary containing rule, or None if it has no banner
+    '''
+    rule = {}
+    for item in items:
+        if item in banners:
+            rule["banner"] = item
+        elif item in devices:
+            rule["deviceType"] = item
+        elif item in vendors:
+            rule["vendor"] = item
+        else:
+            rule["product"] = item
+
+    if "banner" not in rule.keys():
+        return None
+
+    return rule
+
+
+def generateWithLists(transactions, records):
+    '''
+    This function labels and dedups rules the way RuleGenerator.generate did with lists.
+    :param transactions: The InternedTransactions of the records
+    :param records: A list of RelationRecord tuples of item ids
+    :return: A tuple of lists of the rules, their supports and their confidences
+    '''
+    banners = transactions.decode(sorted(transactions.getFirstItemIds()))
+    Support = []
+    Confidence = []
+    Items = []
+    for record in records:
+        items = frozenset(transactions.decode(sorted(record.items)))
+        for orderedStat in record.ordered_statistics:
+            itemsAsSet = getListLabeledRule(items, banners)
+            if itemsAsSet is not None and itemsAsSet not in Items:
+                Items.append(itemsAsSet)
+                Support.append(record.support)
+                Confidence.append(orderedStat.confidence)
+    return Items, Support, Confidence
+
+
+def generateWithHashes(transactions, records):
+    '''
+    This function labels and dedups rules with RuleGenerator.generate, writing them to a scratch file.
+    :param transactions: The InternedTransactions of the records
+    :param records: A list of RelationRecord tuples of item ids
+    :return: A tuple of lists of the rules, their supports and their confidences
+    '''
+    ruleGenerator = RuleGenerator(transactions)
+    ruleGenerator.mineBannerRules = lambda minSupport, minConfidence: iter(records)
+    config.RULE_ENGINE = "banner"
+    dataFrame = ruleGenerator.generate(dataFrame=True)
+    return list(dataFrame["Items"]), list(dataFrame["Support"]), list(dataFrame["Confidence"])
+
+
+def timeGenerate(generate, transactions, records):
+    '''
+    This function times a way of labeling and deduping rules.
+    :param generate: generateWithLists or generateWithHashes
+    :param transactions: The InternedTransactions of the records
+    :param records: A list of RelationRecord tuples of item ids
+    :return: A tuple containing the seconds taken and the rules, supports and confidences
+    '''
+    start = time.perf_counter()
+    rules = generate(transactions, records)
+    return time.perf_counter() - start, rules
+
+
+def main():
+    numBanners = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    numComparedBanners = int(sys.argv[2]) if len(sys.argv) > 2 else 4000
+
+    outPath = tempfile.mkdtemp()
+    config.RULES_FILE = os.path.join(outPath, "rules.csv")
+    config.RULES_JSONL_FILE = None
+    config.RULES_PARQUET_FILE = None
+
+    transactions, records = makeRecords(numComparedBanners, 0)
+    listTime, expected = timeGenerate(generateWithLists, transactions, records)
+    hashTime, actual = timeGenerate(generateWithHashes, transactions, records)
+    print(str(len(records)) + " records, " + str(len(expected[0])) + " rules: lists "
+          + str(round(listTime, 2)) + "s, hashes " + str(round(hashTime, 2)) + "s, "
+          + ("same" if actual == expected else "DIFFERENT"))
+    failed = actual != expected
+
+    transactions, records = makeRecords(numBanners, 1)
+    hashTime, actual = timeGenerate(generateWithHashes, transactions, records)
+    print(str(len(records)) + " records, " + str(len(actual[0])) + " rules: hashes "
+          + str(round(hashTime, 2)) + "s")
+
+    os.remove(config.RULES_FILE)
+    os.rmdir(outPath)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
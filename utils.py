@@ -1,5 +1,15 @@
 from itertools import chain, combinations
+import json
 import re
+from InternedTransactions import InternedTransactions
+
+# Flags stored with every record of the annotations intermediate file
+ANNOTATION_FLAGS = [
+    "deviceTypeFound",
+    "vendorFound",
+    "productFound",
+    "deviceTypeAndVendorFound",
+    "deviceTypeVendorAndProductFound"]
 
 
 def cleanTags(text):
@@ -63,10 +73,36 @@ def makeAllTransactions(bannerToAnnotationsMap):
     This function creates transactions using banners and their annotations.
     :param banners: A string containing banner text
     :param bannerToAnnotationsMap: A dictionary that maps banners to their annotations
-    :return: A list of all transactions
+    :return: An InternedTransactions of all transactions, holding integer ids instead of items
+    '''
+    return InternedTransactions(chain.from_iterable(
+        makeTransactions(banner, annotations)
+        for banner, annotations in bannerToAnnotationsMap.items()))
+
+
+def writeAnnotationsRecord(annotationsFile, url, annotations, *flags):
     '''
-    allTransactions = []
-    for banner, annotations in bannerToAnnotationsMap.items():
-        allTransactions += makeTransactions(banner, annotations)
+    This function appends the annotation findings for a URL to the annotations intermediate file.
+    :param annotationsFile: A file object opened for writing
+    :param url: A string containing the URL of the page
+    :param annotations: A list of (device type, vendor, product) tuples found in the page
+    :param flags: Bools in the order of ANNOTATION_FLAGS
+    :return: None. A JSON record is written as a single line
+    '''
+    record = {"url": url, "annotations": annotations}
+    record.update(zip(ANNOTATION_FLAGS, flags))
+    annotationsFile.write(json.dumps(record) + "\n")
+
 
-    return allTransactions
+def readAnnotationsRecords(fileName):
+    '''
+    This function reads the annotations intermediate file one record at a time.
+    :param fileName: A string containing the path of the annotations intermediate file
+    :return: A generator of dictionaries containing the "url", its "annotations" (as tuples) and the ANNOTATION_FLAGS
+    '''
+    with open(fileName) as annotationsFile:
+        for line in annotationsFile:
+            record = json.loads(line)
+            record["annotations"] = [tuple(annotation)
+                                     for annotation in record["annotations"]]
+            yield record